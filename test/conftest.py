@@ -4,18 +4,97 @@ Pytest configuration and shared fixtures for jasmin-lsp tests.
 This module provides common utilities and fixtures used across all test categories.
 """
 
+import functools
 import json
+import selectors
 import subprocess
+import sys
+import tempfile
 import time
 import os
 from pathlib import Path
-from typing import Dict, Any, Optional, List
+from typing import Dict, Any, Optional, List, Tuple
 import pytest
 
+try:
+    import orjson
+except ImportError:  # optional, falls back to the json module
+    orjson = None
+
 
 # Get the LSP server path
-LSP_SERVER = Path(__file__).parent.parent / "_build" / "default" / "jasmin-lsp" / "jasmin_lsp.exe"
-FIXTURES_DIR = Path(__file__).parent / "fixtures"
+LSP_SERVER = Path(__file__).resolve().parent.parent / "_build" / "default" / "jasmin-lsp" / "jasmin_lsp.exe"
+FIXTURES_DIR = Path(__file__).resolve().parent / "fixtures"
+
+# Server pipes of 1 MiB instead of 64 KiB, so that pipelined requests and
+# large responses do not stall on a full pipe; Popen takes pipesize from
+# Python 3.10 and applies it on Linux only
+_POPEN_PIPE_OPTIONS = {"pipesize": 1 << 20} if sys.version_info >= (3, 10) else {}
+
+
+if orjson is not None:
+    _json_dumps = orjson.dumps
+    _json_loads = orjson.loads
+else:
+    def _json_dumps(obj: Any) -> bytes:
+        return json.dumps(obj).encode('utf-8')
+    _json_loads = json.loads
+
+
+# Body of a request whose params are a text document position, filled in
+# with (id, method, JSON-encoded uri, line, character, extra params)
+_POSITION_REQUEST = (
+    b'{"jsonrpc":"2.0","id":%d,"method":"%s","params":{'
+    b'"textDocument":{"uri":%s},"position":{"line":%d,"character":%d}%s}}'
+)
+
+# The handshake is identical on every server (re)start, so its message
+# bodies are serialized once; only the initialize request id varies
+_INITIALIZE_REQUEST = b'{"jsonrpc":"2.0","id":%d,"method":"initialize","params":%s}'
+_INITIALIZED_NOTIFICATION = b'{"jsonrpc":"2.0","method":"initialized","params":{}}'
+_EXIT_NOTIFICATION = b'{"jsonrpc":"2.0","method":"exit"}'
+
+# Cancellation of the request with the given id
+_CANCEL_NOTIFICATION = b'{"jsonrpc":"2.0","method":"$/cancelRequest","params":{"id":%d}}'
+
+# collect_diagnostics() stops once the server has been silent this long
+_DIAGNOSTICS_IDLE_TIMEOUT = 0.5
+
+
+@functools.lru_cache(maxsize=None)
+def _initialize_params(root_uri: str) -> bytes:
+    """Serialized params of the initialize request for a workspace root."""
+    return _json_dumps({
+        "processId": os.getpid(),
+        "rootUri": root_uri,
+        "capabilities": {
+            "textDocument": {
+                "hover": {"contentFormat": ["markdown", "plaintext"]},
+                "definition": {"linkSupport": True},
+                "references": {"context": {"includeDeclaration": True}},
+            }
+        }
+    })
+
+
+@functools.lru_cache(maxsize=None)
+def _read_fixture(path: str, mtime_ns: int) -> str:
+    """Read a fixture file, cached by path and modification time."""
+    return Path(path).read_text()
+
+
+def read_source(path) -> str:
+    """
+    Read a source file, reusing its contents while the file is unchanged.
+    
+    Args:
+        path: The file path
+        
+    Returns:
+        The file content
+    """
+    path = Path(path)
+    return _read_fixture(str(path), path.stat().st_mtime_ns)
 
 
 class LSPClient:
@@ -29,12 +108,36 @@ class LSPClient:
     - Managing document lifecycle (open, change, close)
     """
     
+    HEADER_TERMINATOR = b"\r\n\r\n"
+    
     def __init__(self, server_path: Path = LSP_SERVER):
         """Initialize the LSP client with a server path."""
         self.server_path = server_path
         self.process = None
         self.msg_id = 0
         self.initialized = False
+        # Id of an initialize request sent by begin_initialize(), if any
+        self._init_request_id = None
+        # Bytes read from the server's stdout that are not yet consumed
+        self._rbuf = bytearray()
+        # Scratch buffer every read from stdout goes through
+        self._chunk = bytearray(65536)
+        # Readiness selector for the server's stdout, registered once per process
+        self._sel = None
+        self._stdin_fd = None
+        # The server's stderr goes to a file: a pipe nobody drains would
+        # block a verbose server once it fills
+        self._stderr_file = None
+        # Raw notifications skipped while waiting for a specific response
+        self._pending_notifications: List[bytes] = []
+        # Latest published diagnostics per URI not yet handed to a test
+        self._diag_by_uri: Dict[str, List[Dict[str, Any]]] = {}
+        # Server-side state that reset() has to undo: the text of every
+        # open document by URI, and the master file
+        self._open_documents: Dict[str, str] = {}
+        self._master_file = None
+        # Documents reset() keeps open, with their text (see pin_document)
+        self._pinned_documents: Dict[str, str] = {}
         
     def start(self):
         """Start the LSP server process."""
@@ -44,24 +147,42 @@ class LSPClient:
                 "Please build it first with: pixi run build"
             )
         
+        # close_fds=False (and no preexec_fn) lets subprocess use posix_spawn
+        # instead of fork+exec; pipes are non-inheritable, so none leak
+        self._stderr_file = tempfile.TemporaryFile()
         self.process = subprocess.Popen(
             [str(self.server_path)],
             stdin=subprocess.PIPE,
             stdout=subprocess.PIPE,
-            stderr=subprocess.PIPE,
-            bufsize=0
+            stderr=self._stderr_file,
+            bufsize=0,
+            close_fds=False,
+            **_POPEN_PIPE_OPTIONS
         )
+        self._rbuf.clear()
+        self._init_request_id = None
+        self._pending_notifications.clear()
+        self._diag_by_uri.clear()
+        self._open_documents.clear()
+        self._master_file = None
+        self._sel = selectors.DefaultSelector()
+        self._sel.register(self.process.stdout, selectors.EVENT_READ)
+        self._stdin_fd = self.process.stdin.fileno()
         
     def stop(self):
         """Stop the LSP server process."""
         if self.process:
             try:
-                self.send_notification("exit")
+                self._write_frame(_EXIT_NOTIFICATION)
                 self.process.terminate()
                 self.process.wait(timeout=2)
             except:
                 self.process.kill()
             finally:
+                self._sel.close()
+                self._sel = None
+                self._stderr_file.close()
+                self._stderr_file = None
                 self.process = None
                 self.initialized = False
     
@@ -105,15 +226,128 @@ class LSPClient:
         
         self._send_message(msg)
     
+    def cancel_request(self, req_id: int):
+        """
+        Tell the server a request's result is no longer needed.
+        
+        A server that already answered, or does not support cancellation,
+        still sends a response; read_response() with expect_id skips it.
+        
+        Args:
+            req_id: The ID returned by send_request()
+        """
+        self._write_frame(_CANCEL_NOTIFICATION % req_id)
+    
     def _send_message(self, msg: Dict[str, Any]):
         """Internal method to send a JSON-RPC message with proper headers."""
-        msg_str = json.dumps(msg)
-        msg_bytes = msg_str.encode('utf-8')
-        header = f"Content-Length: {len(msg_bytes)}\r\n\r\n"
+        self._write_frame(_json_dumps(msg))
+    
+    def _send_position_request(self, method: str, uri: str, line: int, character: int,
+                               extra: bytes = b"") -> int:
+        """
+        Send a request whose params are a text document position.
+        
+        These are the most frequent requests, so the body is formatted from
+        a byte template instead of being serialized from nested dicts.
+        
+        Args:
+            method: The LSP method name (e.g., "textDocument/hover")
+            uri: The document URI
+            line: The line number (0-indexed)
+            character: The character position (0-indexed)
+            extra: Additional JSON members for params, each preceded by a comma
+            
+        Returns:
+            The request ID
+        """
+        self.msg_id += 1
+        self._write_frame(_POSITION_REQUEST % (
+            self.msg_id, method.encode('ascii'), _json_dumps(uri),
+            line, character, extra
+        ))
+        return self.msg_id
+    
+    def _write_frame(self, body: bytes):
+        """Write a message body to the server, preceded by its header."""
+        header = b"Content-Length: %d\r\n\r\n" % len(body)
+        
+        # stdin is unbuffered (bufsize=0): gather header and body in one
+        # syscall on its fd, finishing any short write with plain writes
+        written = os.writev(self._stdin_fd, [header, body])
+        if written < len(header) + len(body):
+            rest = memoryview(header + body)[written:]
+            while rest:
+                rest = rest[os.write(self._stdin_fd, rest):]
+    
+    def _fill(self, deadline: float) -> bool:
+        """
+        Wait until the server's stdout is readable and append what is available.
         
-        self.process.stdin.write(header.encode('utf-8'))
-        self.process.stdin.write(msg_bytes)
-        self.process.stdin.flush()
+        Args:
+            deadline: ``time.monotonic()`` value after which to give up
+            
+        Returns:
+            False on timeout or EOF, True if bytes were buffered
+        """
+        remaining = deadline - time.monotonic()
+        if remaining <= 0 or not self._sel.select(remaining):
+            return False
+        
+        # stdout is unbuffered, so readinto is a single read() syscall
+        n = self.process.stdout.readinto(self._chunk)
+        if not n:
+            return False
+        self._rbuf += memoryview(self._chunk)[:n]
+        return True
+    
+    def _read_frame(self, deadline: float) -> Optional[bytes]:
+        """
+        Read the body of one framed JSON-RPC message from the server.
+        
+        Bytes are pulled from stdout in large chunks into ``self._rbuf``;
+        anything past the end of the current message stays buffered for
+        the next call.
+        
+        Args:
+            deadline: ``time.monotonic()`` value after which to give up
+            
+        Returns:
+            The raw JSON body, or None on timeout, EOF or a malformed header
+        """
+        # Read until the end of the header block is buffered
+        while True:
+            header_end = self._rbuf.find(self.HEADER_TERMINATOR)
+            if header_end != -1:
+                break
+            if not self._fill(deadline):
+                return None
+        
+        # Content-Length is the only header we care about
+        content_length = 0
+        for line in bytes(self._rbuf[:header_end]).split(b"\r\n"):
+            if line.lower().startswith(b"content-length:"):
+                content_length = int(line.split(b":", 1)[1])
+        body_start = header_end + len(self.HEADER_TERMINATOR)
+        if content_length == 0:
+            del self._rbuf[:body_start]
+            return None
+        
+        # Read until the whole body is buffered
+        body_end = body_start + content_length
+        while len(self._rbuf) < body_end:
+            if not self._fill(deadline):
+                return None
+        
+        # Copy the body out once, through a view rather than a sliced bytearray
+        with memoryview(self._rbuf) as view:
+            content = bytes(view[body_start:body_end])
+        del self._rbuf[:body_end]
+        return content
+    
+    def _read_message(self, deadline: float) -> Optional[Dict[str, Any]]:
+        """Read and parse one JSON-RPC message, or None (see _read_frame)."""
+        content = self._read_frame(deadline)
+        return None if content is None else _json_loads(content)
     
     def read_response(self, timeout: float = 5.0, expect_id: Optional[int] = None) -> Optional[Dict[str, Any]]:
         """
@@ -126,36 +360,23 @@ class LSPClient:
         Returns:
             The parsed JSON response, or None if timeout
         """
-        start_time = time.time()
-        
-        while time.time() - start_time < timeout:
-            # Read headers
-            headers = {}
-            while True:
-                line = self.process.stdout.readline()
-                if not line:
-                    return None
-                
-                line = line.decode('utf-8').strip()
-                if not line:
-                    break
-                
-                if ':' in line:
-                    key, value = line.split(':', 1)
-                    headers[key.strip()] = value.strip()
-            
-            # Read content
-            content_length = int(headers.get('Content-Length', 0))
-            if content_length == 0:
+        deadline = time.monotonic() + timeout
+        
+        while True:
+            content = self._read_frame(deadline)
+            if content is None:
                 return None
             
-            content = self.process.stdout.read(content_length)
-            response = json.loads(content.decode('utf-8'))
-            
             # If we're looking for a specific ID, check if this is it
             if expect_id is not None:
-                # Skip notifications (no id field)
+                # Notifications are stashed for the diagnostics helpers; most
+                # can be recognised without parsing, as "id" never appears
+                if b'"id"' not in content:
+                    self._pending_notifications.append(content)
+                    continue
+                response = _json_loads(content)
                 if "id" not in response:
+                    self._pending_notifications.append(content)
                     continue
                 # Return if this is the response we want
                 if response.get("id") == expect_id:
@@ -164,37 +385,62 @@ class LSPClient:
                 continue
             
             # If not looking for specific ID, return first response
-            return response
+            return _json_loads(content)
+    
+    def _sync(self, uri: str):
+        """
+        Wait until the server has processed every message sent so far.
+        
+        The server handles messages in order, so the reply to a cheap
+        documentSymbol request is a barrier for preceding notifications.
         
-        return None
+        Args:
+            uri: A document URI to address the request to
+            
+        Raises:
+            RuntimeError: If the server exits or does not answer in time
+        """
+        req_id = self.send_request("textDocument/documentSymbol", {"textDocument": {"uri": uri}})
+        if self.read_response(expect_id=req_id) is None:
+            state = "is still running" if self.is_alive() else "has exited"
+            raise RuntimeError(
+                f"LSP server did not answer a documentSymbol request for {uri} "
+                f"and {state}; stderr:\n{self.get_stderr()}"
+            )
+    
+    def begin_initialize(self, root_uri: str = "file:///tmp"):
+        """
+        Send the initialize request without waiting for the response.
+        
+        The handshake is completed by the next call to initialize(), so the
+        server can start up while the caller does something else.
+        
+        Args:
+            root_uri: The root URI of the workspace
+        """
+        self.msg_id += 1
+        self._write_frame(_INITIALIZE_REQUEST % (self.msg_id, _initialize_params(root_uri)))
+        self._init_request_id = self.msg_id
     
     def initialize(self, root_uri: str = "file:///tmp") -> Dict[str, Any]:
         """
         Send the initialize request and wait for response.
         
+        If begin_initialize() was called, its request is awaited instead.
+        
         Args:
             root_uri: The root URI of the workspace
             
         Returns:
             The initialize response
         """
-        params = {
-            "processId": os.getpid(),
-            "rootUri": root_uri,
-            "capabilities": {
-                "textDocument": {
-                    "hover": {"contentFormat": ["markdown", "plaintext"]},
-                    "definition": {"linkSupport": True},
-                    "references": {"context": {"includeDeclaration": True}},
-                }
-            }
-        }
-        
-        req_id = self.send_request("initialize", params)
-        response = self.read_response()
+        if self._init_request_id is None:
+            self.begin_initialize(root_uri)
+        response = self.read_response(expect_id=self._init_request_id)
+        self._init_request_id = None
         
         # Send initialized notification
-        self.send_notification("initialized", {})
+        self._write_frame(_INITIALIZED_NOTIFICATION)
         self.initialized = True
         
         return response
@@ -203,12 +449,18 @@ class LSPClient:
         """
         Open a document in the LSP server.
         
+        Opening a document that is already open with the same text is a
+        no-op, so the server does not parse and check it again.
+        
         Args:
             uri: The document URI
             text: The document content
             language_id: The language ID (default: "jasmin")
             version: The document version (default: 1)
         """
+        if self._open_documents.get(uri) == text:
+            return
+        
         params = {
             "textDocument": {
                 "uri": uri,
@@ -218,8 +470,8 @@ class LSPClient:
             }
         }
         self.send_notification("textDocument/didOpen", params)
-        # Give server time to process
-        time.sleep(0.1)
+        self._open_documents[uri] = text
+        self._sync(uri)
     
     def close_document(self, uri: str):
         """
@@ -230,6 +482,31 @@ class LSPClient:
         """
         params = {"textDocument": {"uri": uri}}
         self.send_notification("textDocument/didClose", params)
+        self._open_documents.pop(uri, None)
+    
+    def pin_document(self, uri: str, text: str):
+        """
+        Open a document that stays open across reset().
+        
+        reset() restores the document to this text, re-opening it if a
+        test closed or changed it or if the server was restarted.
+        
+        Args:
+            uri: The document URI
+            text: The document content
+        """
+        self._pinned_documents[uri] = text
+        self.open_document(uri, text)
+    
+    def unpin_document(self, uri: str):
+        """
+        Close a document opened with pin_document.
+        
+        Args:
+            uri: The document URI
+        """
+        self._pinned_documents.pop(uri, None)
+        self.close_document(uri)
     
     def change_document(self, uri: str, text: str, version: int):
         """
@@ -245,7 +522,9 @@ class LSPClient:
             "contentChanges": [{"text": text}]
         }
         self.send_notification("textDocument/didChange", params)
-        time.sleep(0.1)
+        if uri in self._open_documents:
+            self._open_documents[uri] = text
+        self._sync(uri)
     
     def hover(self, uri: str, line: int, character: int) -> Optional[Dict[str, Any]]:
         """
@@ -259,13 +538,31 @@ class LSPClient:
         Returns:
             The hover response
         """
-        params = {
-            "textDocument": {"uri": uri},
-            "position": {"line": line, "character": character}
-        }
-        req_id = self.send_request("textDocument/hover", params)
+        req_id = self._send_position_request("textDocument/hover", uri, line, character)
         return self.read_response(expect_id=req_id)
     
+    def hover_many(self, uri: str, positions: List[Tuple[int, int]]) -> List[Optional[Dict[str, Any]]]:
+        """
+        Request hover information at several positions at once.
+        
+        Every request is written before any response is read, so there is
+        one round trip for all positions instead of one per position. (The
+        server does not answer JSON-RPC batch arrays, hence the pipelining.)
+        
+        Args:
+            uri: The document URI
+            positions: (line, character) pairs, 0-indexed
+            
+        Returns:
+            The hover responses, in the order of positions
+        """
+        req_ids = [
+            self._send_position_request("textDocument/hover", uri, line, character)
+            for line, character in positions
+        ]
+        # Responses come back in request order
+        return [self.read_response(expect_id=req_id) for req_id in req_ids]
+    
     def definition(self, uri: str, line: int, character: int) -> Optional[Dict[str, Any]]:
         """
         Request go-to-definition at a position.
@@ -278,11 +575,7 @@ class LSPClient:
         Returns:
             The definition response
         """
-        params = {
-            "textDocument": {"uri": uri},
-            "position": {"line": line, "character": character}
-        }
-        req_id = self.send_request("textDocument/definition", params)
+        req_id = self._send_position_request("textDocument/definition", uri, line, character)
         return self.read_response(expect_id=req_id)
     
     def references(self, uri: str, line: int, character: int, 
@@ -299,12 +592,9 @@ class LSPClient:
         Returns:
             The references response
         """
-        params = {
-            "textDocument": {"uri": uri},
-            "position": {"line": line, "character": character},
-            "context": {"includeDeclaration": include_declaration}
-        }
-        req_id = self.send_request("textDocument/references", params)
+        context = b',"context":{"includeDeclaration":%s}' % (
+            b"true" if include_declaration else b"false")
+        req_id = self._send_position_request("textDocument/references", uri, line, character, context)
         return self.read_response(expect_id=req_id)
     
     def document_symbols(self, uri: str) -> Optional[Dict[str, Any]]:
@@ -349,64 +639,84 @@ class LSPClient:
         Returns:
             The rename response
         """
-        params = {
-            "textDocument": {"uri": uri},
-            "position": {"line": line, "character": character},
-            "newName": new_name
-        }
-        req_id = self.send_request("textDocument/rename", params)
+        new_name_json = b',"newName":' + _json_dumps(new_name)
+        req_id = self._send_position_request("textDocument/rename", uri, line, character, new_name_json)
         return self.read_response(expect_id=req_id)
     
     def is_alive(self) -> bool:
         """Check if the server process is still running."""
         return self.process is not None and self.process.poll() is None
     
+    def get_stderr(self) -> str:
+        """Return everything the server has written to stderr so far."""
+        if self._stderr_file is None:
+            return ""
+        self._stderr_file.seek(0)
+        return self._stderr_file.read().decode('utf-8', errors='replace')
+    
+    def _record_notification(self, msg: Dict[str, Any]):
+        """Keep the payload of a publishDiagnostics notification by URI."""
+        if msg.get('method') == 'textDocument/publishDiagnostics':
+            self._diag_by_uri[msg['params']['uri']] = msg['params']['diagnostics']
+    
+    def _drain_pending_notifications(self):
+        """Parse the notifications stashed by read_response."""
+        for content in self._pending_notifications:
+            self._record_notification(_json_loads(content))
+        self._pending_notifications.clear()
+    
+    def wait_for_diagnostics(self, uri: str, timeout: float = 5.0) -> Optional[List[Dict[str, Any]]]:
+        """
+        Wait for the diagnostics published for one document.
+        
+        Returns as soon as a publishDiagnostics notification for the URI has
+        been received, including one received earlier while waiting for a
+        response, instead of listening for a fixed amount of time.
+        
+        Args:
+            uri: The document URI
+            timeout: Maximum time to wait for the notification
+            
+        Returns:
+            The latest diagnostics for the URI, or None if timeout
+        """
+        deadline = time.monotonic() + timeout
+        
+        self._drain_pending_notifications()
+        while uri not in self._diag_by_uri:
+            msg = self._read_message(deadline)
+            if msg is None:
+                return None
+            self._record_notification(msg)
+        
+        return self._diag_by_uri.pop(uri)
+    
     def collect_diagnostics(self, timeout: float = 1.0) -> Dict[str, List[Dict[str, Any]]]:
         """
         Collect diagnostic notifications from the server.
         
+        Returns early once no message has arrived for
+        _DIAGNOSTICS_IDLE_TIMEOUT seconds.
+        
         Args:
             timeout: Maximum time to wait for diagnostics
             
         Returns:
             Dictionary mapping URIs to lists of diagnostics
         """
-        import select
-        
-        diagnostics_by_uri = {}
-        end_time = time.time() + timeout
-        attempts = 0
+        deadline = time.monotonic() + timeout
         
-        while time.time() < end_time:
-            remaining = end_time - time.time()
-            if remaining <= 0:
+        # Start with notifications skipped earlier while waiting for responses
+        self._drain_pending_notifications()
+        while True:
+            idle_deadline = time.monotonic() + _DIAGNOSTICS_IDLE_TIMEOUT
+            resp = self._read_message(min(deadline, idle_deadline))
+            if resp is None:
                 break
-            
-            try:
-                # Check if there's data available
-                ready, _, _ = select.select([self.process.stdout], [], [], 0.1)
-                if ready:
-                    resp = self.read_response(timeout=0.1)
-                    if resp:
-                        if resp.get('method') == 'textDocument/publishDiagnostics':
-                            uri = resp['params']['uri']
-                            diagnostics = resp['params']['diagnostics']
-                            diagnostics_by_uri[uri] = diagnostics
-                        attempts = 0  # Reset attempts if we got something
-                    else:
-                        attempts += 1
-                else:
-                    attempts += 1
-                
-                # If no data for a while, stop waiting
-                if attempts > 5:
-                    break
-                    
-                time.sleep(0.05)
-            except Exception:
-                attempts += 1
-                time.sleep(0.05)
+            self._record_notification(resp)
         
+        diagnostics_by_uri = self._diag_by_uri
+        self._diag_by_uri = {}
         return diagnostics_by_uri
     
     def set_master_file(self, uri: str):
@@ -417,39 +727,127 @@ class LSPClient:
             uri: The URI of the master file
         """
         self.send_notification("jasmin/setMasterFile", {"uri": uri})
+        self._master_file = uri
+    
+    def reset(self):
+        """
+        Return the server to a clean state so the next test can reuse it.
+        
+        Documents left open are closed, except pinned ones which are
+        restored to their pinned text. A master file cannot be unset over
+        the protocol, so if one was set (or the server died) the server is
+        restarted instead.
+        """
+        if self._master_file is not None or not self.is_alive():
+            self.stop()
+            self.start()
+            self.initialize()
+        else:
+            for uri in list(self._open_documents):
+                if uri not in self._pinned_documents:
+                    self.close_document(uri)
+        
+        # No-op for pinned documents that are still open and unchanged
+        for uri, text in self._pinned_documents.items():
+            self.open_document(uri, text)
+        # The reply only matters as a barrier, so the URI need not be open
+        self._sync("file:///")
+        self._pending_notifications.clear()
+        self._diag_by_uri.clear()
+
+
+# Pytest Hooks
+
+# Server started by pytest_configure for the session's lsp_client
+_prewarmed_client: Optional[LSPClient] = None
+
+
+def pytest_configure(config):
+    """Start the LSP server early so its startup overlaps test collection."""
+    global _prewarmed_client
+    # The xdist controller runs no tests; every worker warms up its own server
+    if getattr(config.option, "numprocesses", None) and not hasattr(config, "workerinput"):
+        return
+    if config.option.collectonly or not LSP_SERVER.exists():
+        return
+    
+    client = LSPClient(LSP_SERVER)
+    client.start()
+    client.begin_initialize()
+    _prewarmed_client = client
+
+
+def pytest_unconfigure(config):
+    """Stop the pre-warmed server if no test used it."""
+    global _prewarmed_client
+    if _prewarmed_client is not None:
+        _prewarmed_client.stop()
+        _prewarmed_client = None
 
 
 # Pytest Fixtures
 
-@pytest.fixture
+@pytest.fixture(scope="session")
 def lsp_server_path():
     """Provide the path to the LSP server executable."""
     return LSP_SERVER
 
 
-@pytest.fixture
+@pytest.fixture(scope="session")
 def fixtures_dir():
     """Provide the path to the test fixtures directory."""
     return FIXTURES_DIR
 
 
-@pytest.fixture
+@pytest.fixture(scope="session")
 def lsp_client(lsp_server_path):
     """
-    Provide an LSP client that starts and stops automatically.
+    Provide an LSP client shared by every test in the session.
     
-    The client is initialized and ready to use. It will be
-    properly shut down after the test completes.
+    The server is started and initialized once, usually already warmed up
+    by ``pytest_configure``, and reset after each test that used it (see
+    ``_reset_lsp_client``). It will be properly shut down at the end of
+    the session.
+    """
+    global _prewarmed_client
+    client, _prewarmed_client = _prewarmed_client, None
+    if client is None or client.server_path != lsp_server_path or not client.is_alive():
+        if client is not None:
+            client.stop()
+        client = LSPClient(lsp_server_path)
+        client.start()
+    client.initialize()
+    
+    yield client
+    
+    client.stop()
+
+
+@pytest.fixture
+def isolated_lsp_client(lsp_server_path):
+    """
+    Provide a started (but not initialized) LSP client of the test's own.
+    
+    For tests that corrupt the transport, e.g. with malformed frames,
+    and so must not share the session server.
     """
     client = LSPClient(lsp_server_path)
     client.start()
-    client.initialize()
     
     yield client
     
     client.stop()
 
 
+@pytest.fixture(autouse=True)
+def _reset_lsp_client(request):
+    """Reset the shared LSP client after each test that used it."""
+    yield
+    
+    if "lsp_client" in request.fixturenames:
+        request.getfixturevalue("lsp_client").reset()
+
+
 @pytest.fixture
 def temp_document(lsp_client, tmp_path):
     """
@@ -477,6 +875,56 @@ def temp_document(lsp_client, tmp_path):
         lsp_client.close_document(uri)
 
 
+@pytest.fixture(scope="module")
+def module_document(lsp_client, tmp_path_factory):
+    """
+    Provide a helper to open documents shared by all tests of a module.
+    
+    Unlike ``temp_document``, documents are opened once and stay open
+    (and unchanged) across the tests of the module.
+    
+    Usage:
+        @pytest.fixture(scope="module")
+        def shared_uri(module_document):
+            return module_document("fn test() { }")
+    """
+    pinned_documents = []
+    directory = tmp_path_factory.mktemp("module_documents")
+    
+    def open_shared_doc(content: str, filename: str = "test.jazz") -> str:
+        file_path = directory / filename
+        file_path.write_text(content)
+        uri = f"file://{file_path}"
+        lsp_client.pin_document(uri, content)
+        pinned_documents.append(uri)
+        return uri
+    
+    yield open_shared_doc
+    
+    # Cleanup
+    for uri in pinned_documents:
+        lsp_client.unpin_document(uri)
+
+
+def _load_fixture(fixtures_dir: Path, filename: str) -> tuple[str, str]:
+    """
+    Read a fixture file.
+    
+    Args:
+        fixtures_dir: The fixtures directory
+        filename: The fixture filename
+        
+    Returns:
+        A tuple of (file_uri, file_content)
+    """
+    file_path = fixtures_dir / filename
+    try:
+        content = read_source(file_path)
+    except FileNotFoundError:
+        raise FileNotFoundError(f"Fixture not found: {filename}") from None
+    return f"file://{file_path.absolute()}", content
+
+
 @pytest.fixture
 def fixture_file(lsp_client, fixtures_dir):
     """
@@ -499,12 +947,7 @@ def fixture_file(lsp_client, fixtures_dir):
         Returns:
             A tuple of (file_uri, file_content)
         """
-        file_path = fixtures_dir / filename
-        if not file_path.exists():
-            raise FileNotFoundError(f"Fixture not found: {filename}")
-        
-        content = file_path.read_text()
-        uri = f"file://{file_path.absolute()}"
+        uri, content = _load_fixture(fixtures_dir, filename)
         lsp_client.open_document(uri, content)
         opened_documents.append(uri)
         return uri, content
@@ -516,6 +959,34 @@ def fixture_file(lsp_client, fixtures_dir):
         lsp_client.close_document(uri)
 
 
+@pytest.fixture(scope="module")
+def module_fixture_file(lsp_client, fixtures_dir):
+    """
+    Provide a helper to open fixture files shared by all tests of a module.
+    
+    Like ``module_document``, the files are opened once and stay open
+    across the tests of the module.
+    
+    Usage:
+        @pytest.fixture(scope="module")
+        def lib_file(module_fixture_file):
+            return module_fixture_file("math_lib.jazz")
+    """
+    pinned_documents = []
+    
+    def open_shared_fixture(filename: str) -> tuple[str, str]:
+        uri, content = _load_fixture(fixtures_dir, filename)
+        lsp_client.pin_document(uri, content)
+        pinned_documents.append(uri)
+        return uri, content
+    
+    yield open_shared_fixture
+    
+    # Cleanup
+    for uri in pinned_documents:
+        lsp_client.unpin_document(uri)
+
+
 def file_uri(path: Path) -> str:
     """Convert a file path to a file:// URI."""
     return f"file://{path.absolute()}"
@@ -544,6 +1015,23 @@ def assert_has_result(response: Dict[str, Any], request_type: str = "request"):
     assert "result" in response, f"{request_type} has no 'result' field"
 
 
+def assert_ok_result(response: Optional[Dict[str, Any]], request_type: str = "request") -> Any:
+    """
+    Assert what assert_response_ok() and assert_has_result() do, in one pass.
+    
+    Args:
+        response: The JSON-RPC response
+        request_type: Description of the request type for error messages
+        
+    Returns:
+        The response's result, which may be None
+    """
+    assert response is not None, f"{request_type} returned no response"
+    assert "error" not in response, f"{request_type} returned error: {response['error']}"
+    assert "result" in response, f"{request_type} has no 'result' field"
+    return response["result"]
+
+
 def assert_result_not_null(response: Dict[str, Any], request_type: str = "request"):
     """
     Assert that a response's result is not null.
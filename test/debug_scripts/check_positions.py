@@ -1,7 +1,23 @@
 #!/usr/bin/env python3
-"""Check positions in test code."""
+"""Print the line/column of identifiers in test code.
 
-TEST_CODE = """fn test() {
+Usage:
+    check_positions.py                        # all built-in samples
+    check_positions.py --sample scope         # one built-in sample
+    check_positions.py --code file.jazz       # a Jasmin file
+    check_positions.py --code file.jazz --pattern status --pattern a
+"""
+
+import argparse
+import re
+import sys
+from pathlib import Path
+
+IDENT = re.compile(r"\b[A-Za-z_]\w*\b")
+
+# Code snippets from the tests, with the identifiers they were checked for
+SAMPLES = {
+    "locals": ("""fn test() {
   reg u32 i, j;
   stack u64 x, y, z;
   i = 1;
@@ -9,11 +25,87 @@ TEST_CODE = """fn test() {
   x = 3;
   y = 4;
   z = 5;
-}"""
-
-lines = TEST_CODE.split('\n')
-for i, line in enumerate(lines):
-    print(f"Line {i}: {repr(line)}")
-    for j, char in enumerate(line):
-        if char in 'ijxyz' and j > 0 and line[j-1] in ' ,':
-            print(f"  '{char}' is at column {j}")
+}""", ["i", "j", "x", "y", "z"]),
+    "params": ("""fn test(reg u32 a b, stack u64 x y z) -> reg u32 {
+  reg u16 i, j, k;
+  stack u8 p, q;
+  return a;
+}""", ["a", "b", "x", "y", "z", "i", "j", "k", "p", "q"]),
+    "multi_params": ("""fn test(reg u32 a, b, stack u64 x, y, z) -> reg u32 {
+  return a;
+}""", ["a", "b", "x", "y", "z"]),
+    "scope": ("""export fn first_function(
+    #public reg ptr u8[32] sig
+) -> #public reg u32
+{
+    reg u32 status;
+
+    status = 0;
+
+    return status;
+}
+
+export fn second_function(
+    #public reg ptr u8[64] data
+) -> #public reg u32 {
+    reg u32 status;
+
+    status = 1;
+    status = status;
+
+    return status;
+}
+""", ["status"]),
+    "references": ("""fn helper(reg u64 x) -> reg u64 {
+  return x + 1;
+}
+
+fn main() {
+  reg u64 a;
+  reg u64 b;
+  a = helper(5);
+  b = helper(10);
+  return a + b;
+}
+""", ["a"]),
+}
+
+
+def check_positions(lines, patterns=None):
+    """Print every identifier (or only those in patterns) with its column."""
+    wanted = set(patterns) if patterns else None
+    for line_no, line in enumerate(lines):
+        line = line.rstrip('\r\n')
+        matches = [m for m in IDENT.finditer(line)
+                   if wanted is None or m.group() in wanted]
+        if not matches:
+            continue
+        print(f"Line {line_no}: {repr(line)}")
+        for m in matches:
+            print(f"  '{m.group()}' at column {m.start()}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--code", type=Path, help="Jasmin file to scan")
+    parser.add_argument("--sample", choices=sorted(SAMPLES),
+                        help="built-in code sample to scan")
+    parser.add_argument("--pattern", action="append",
+                        help="identifier to report (repeatable, default: all)")
+    args = parser.parse_args()
+
+    if args.code:
+        # Stream the file instead of loading and splitting it
+        with args.code.open() as f:
+            check_positions(f, args.pattern)
+        return 0
+
+    for name in [args.sample] if args.sample else SAMPLES:
+        code, patterns = SAMPLES[name]
+        print(f"=== {name}")
+        check_positions(code.splitlines(), args.pattern or patterns)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -9,127 +9,378 @@ Tests various real-world scenarios that could cause crashes:
 - Resource exhaustion
 """
 
+import functools
 import subprocess
 import json
 import time
 import threading
+import itertools
+import queue
 import os
-import sys
-import random
-import string
+
+import pytest
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
 
 SERVER = "_build/default/jasmin-lsp/jasmin_lsp.exe"
 
+# Only this much of the end of the server's stderr is kept
+STDERR_TAIL = 4096
+
+# Initial size of the buffer server output is read into
+READ_BUFFER_SIZE = 64 * 1024
+
+# Params of the request LSPClient.roundtrip() uses as a barrier
+ROUNDTRIP_PARAMS = b'{"textDocument":{"uri":"file:///tmp/roundtrip.jazz"}}'
+
+# Every scenario initializes the same way, so the params are serialized once
+INITIALIZE_PARAMS = json.dumps({
+    "processId": os.getpid(),
+    "rootUri": f"file://{os.getcwd()}",
+    "capabilities": {}
+}).encode('utf-8')
+
 class LSPClient:
+    # Message bodies are filled in from these templates instead of building
+    # and serializing a dict per message; the last slot takes the params
+    # member (or nothing)
+    _REQUEST_TEMPLATE = b'{"jsonrpc":"2.0","id":%d,"method":%s%s}'
+    _NOTIFICATION_TEMPLATE = b'{"jsonrpc":"2.0","method":%s%s}'
+    # JSON-quoted method names, filled on first use
+    _method_cache = {}
+    
     def __init__(self):
         self.proc = subprocess.Popen(
             [SERVER],
             stdin=subprocess.PIPE,
             stdout=subprocess.PIPE,
-            stderr=subprocess.PIPE,
-            bufsize=0
+            stderr=subprocess.PIPE
         )
-        self.msg_id = 0
-        self.lock = threading.Lock()
+        self._in_fd = self.proc.stdin.fileno()
+        self._ids = itertools.count(1)
         self.crashed = False
+        # Senders only enqueue framed messages; one writer thread owns stdin
+        self._outq = queue.SimpleQueue()
+        self._writer = threading.Thread(target=self._writer_loop, daemon=True)
+        self._writer.start()
+        # Responses by id, with an event per id set when it arrives (or at EOF)
+        self._responses = {}
+        self._response_events = {}
+        # Params of the notifications the server sent, a queue per method;
+        # None in a queue means the server is gone
+        self._notifications = {}
+        threading.Thread(target=self._reader_loop, daemon=True).start()
+        # Draining stderr in the background also keeps a noisy server from
+        # blocking on a full pipe
+        self._stderr_tail = bytearray()
+        threading.Thread(target=self._drain_stderr, daemon=True).start()
         
     def send_message(self, method, params=None, is_notification=False):
-        """Send a JSON-RPC message to the server"""
-        with self.lock:
-            if self.proc.poll() is not None:
-                self.crashed = True
-                return None
+        """Send a JSON-RPC message to the server
+        
+        params may be a JSON value or its already serialized bytes, which
+        skips encoding for static params such as b"{}".
+        
+        The message is framed by the calling thread and handed to the
+        writer thread, so concurrent senders never wait on each other.
+        """
+        if self.crashed or self._exited():
+            self.crashed = True
+            return None
+        
+        msg_id, framed = self._frame(method, params, is_notification)
+        self._outq.put(framed)
+        return msg_id
+    
+    def send_batch(self, messages):
+        """Send several messages with a single write
+        
+        messages are (method, params, is_notification) tuples. Returns their
+        ids, in order, or None if the server is gone.
+        """
+        if self.crashed or self._exited():
+            self.crashed = True
+            return None
+        
+        framed = [self._frame(*message) for message in messages]
+        self._outq.put(b"".join(frame for _, frame in framed))
+        return [msg_id for msg_id, _ in framed]
+    
+    def _frame(self, method, params=None, is_notification=False):
+        """Build a message with its header; returns (msg_id, framed bytes)"""
+        msg_id = next(self._ids)
+        quoted = self._method_cache.get(method)
+        if quoted is None:
+            quoted = self._method_cache[method] = json.dumps(method).encode('utf-8')
+        
+        if params is None:
+            params_member = b""
+        else:
+            if not isinstance(params, bytes):
+                params = orjson.dumps(params) if orjson else json.dumps(params).encode('utf-8')
+            params_member = b',"params":' + params
+        
+        if is_notification:
+            body = self._NOTIFICATION_TEMPLATE % (quoted, params_member)
+        else:
+            body = self._REQUEST_TEMPLATE % (msg_id, quoted, params_member)
+        return msg_id, b"Content-Length: %d\r\n\r\n" % len(body) + body
+    
+    def send_raw(self, data):
+        """Write raw bytes to the server after anything still queued"""
+        self._outq.put(data)
+        return self.flush()
+    
+    def flush(self):
+        """Wait until everything queued so far is written to the server"""
+        written = threading.Event()
+        self._outq.put(written)
+        written.wait()
+        return not self.crashed
+    
+    def _writer_loop(self):
+        """Write queued messages, joining whatever has piled up into one write
+        
+        Queued events are set once the messages ahead of them are written;
+        None stops the loop.
+        """
+        while True:
+            items = [self._outq.get()]
+            while True:
+                try:
+                    items.append(self._outq.get_nowait())
+                except queue.Empty:
+                    break
             
-            self.msg_id += 1
-            msg = {
-                "jsonrpc": "2.0",
-                "method": method
-            }
+            frames = [item for item in items if isinstance(item, bytes)]
+            if frames and not self.crashed:
+                data = memoryview(b"".join(frames))
+                try:
+                    # Straight to the pipe; a large payload may be written in parts
+                    while data:
+                        data = data[os.write(self._in_fd, data):]
+                except OSError:
+                    self.crashed = True
             
-            if not is_notification:
-                msg["id"] = self.msg_id
-                
-            if params is not None:
-                msg["params"] = params
+            for item in items:
+                if isinstance(item, threading.Event):
+                    item.set()
+            if None in items:
+                return
+    
+    def _reader_loop(self):
+        """Read framed messages from stdout, recording responses by id
+        
+        Output is read straight into one reusable buffer; buf[start:end]
+        holds the bytes not parsed yet, and they are moved back to the front
+        only when the buffer's tail is full. Notifications are queued by
+        method; server requests are dropped. At EOF the server is gone, so
+        every waiter is woken up.
+        """
+        fd = self.proc.stdout.fileno()
+        buf = bytearray(READ_BUFFER_SIZE)
+        view = memoryview(buf)
+        start = end = 0
+        while True:
+            sep = buf.find(b"\r\n\r\n", start, end)
+            if sep != -1:
+                length = 0
+                field = buf.find(b"Content-Length:", start, sep)
+                if field != -1:
+                    line_end = buf.find(b"\r\n", field, sep + 2)
+                    length = int(buf[field + 15:line_end])
+                body_end = sep + 4 + length
+                if body_end <= end:
+                    body = view[sep + 4:body_end]
+                    msg = orjson.loads(body) if orjson else json.loads(bytes(body))
+                    start = body_end
+                    if not isinstance(msg, dict):
+                        continue
+                    if "method" not in msg:
+                        if "id" in msg:
+                            self._responses[msg["id"]] = msg
+                            self._response_events.setdefault(msg["id"], threading.Event()).set()
+                    elif "id" not in msg:
+                        self._notification_queue(msg["method"]).put(msg.get("params", {}))
+                    continue
+                needed = body_end - start
+            else:
+                needed = end - start + 1
             
-            msg_str = json.dumps(msg)
-            content = f"Content-Length: {len(msg_str)}\r\n\r\n{msg_str}"
+            # Make room for the rest of the message at the tail
+            if start == end:
+                start = end = 0
+            elif end == len(buf) or needed > len(buf) - start:
+                if needed > len(buf):
+                    # A message larger than the buffer: move to a bigger one
+                    bigger = bytearray(max(needed, 2 * len(buf)))
+                    bigger[:end - start] = view[start:end]
+                    buf, view = bigger, memoryview(bigger)
+                else:
+                    buf[:end - start] = bytes(view[start:end])
+                end -= start
+                start = 0
             
             try:
-                self.proc.stdin.write(content.encode('utf-8'))
-                self.proc.stdin.flush()
-                return self.msg_id
-            except:
+                n = os.readv(fd, [view[end:]])
+            except OSError:
+                n = 0
+            if not n:
                 self.crashed = True
+                for event in list(self._response_events.values()):
+                    event.set()
+                for notifications in list(self._notifications.values()):
+                    notifications.put(None)
+                return
+            end += n
+    
+    def wait_for_response(self, msg_id, timeout=5.0):
+        """Wait for the response to msg_id; None on timeout or if the server exits"""
+        if msg_id is None:
+            return None
+        event = self._response_events.setdefault(msg_id, threading.Event())
+        # The reader may have hit EOF before this event was registered
+        if not self.crashed:
+            event.wait(timeout)
+        return self._responses.pop(msg_id, None)
+    
+    def _notification_queue(self, method):
+        """The queue of notification params for method, created on first use"""
+        notifications = self._notifications.get(method)
+        if notifications is None:
+            notifications = self._notifications.setdefault(method, queue.SimpleQueue())
+        return notifications
+    
+    def wait_for_notification(self, method, match=None, timeout=5.0):
+        """Wait for a method notification whose params satisfy match
+        
+        Notifications that do not match are discarded. Returns the params,
+        or None on timeout or if the server exits.
+        """
+        notifications = self._notification_queue(method)
+        deadline = time.monotonic() + timeout
+        while not self.crashed or not notifications.empty():
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return None
+            try:
+                params = notifications.get(timeout=remaining)
+            except queue.Empty:
+                return None
+            if params is None:
                 return None
+            if match is None or match(params):
+                return params
+        return None
+    
+    def begin_init(self):
+        """Send the handshake without waiting for the server; returns the initialize id
+        
+        initialized is sent in the same write as initialize: the server
+        handles messages in order, so it never sees it early, nor any
+        message sent after it.
+        """
+        init_id, _ = self.send_batch([
+            ("initialize", INITIALIZE_PARAMS, False),
+            ("initialized", b"{}", True),
+        ]) or (None, None)
+        return init_id
+    
+    def init_sync(self, timeout=5.0):
+        """Initialize the server; returns the initialize response"""
+        return self.wait_for_response(self.begin_init(), timeout)
+    
+    def roundtrip(self, timeout=5.0):
+        """Wait until the server has handled everything sent so far
+        
+        Messages are handled in order, so the reply to a cheap request
+        (documentSymbol on an unknown file) comes after all earlier ones.
+        Returns whether the server answered.
+        """
+        msg_id = self.send_message("textDocument/documentSymbol", ROUNDTRIP_PARAMS)
+        return self.wait_for_response(msg_id, timeout) is not None
+    
+    def wait_for_idle(self, duration):
+        """Give the server duration seconds, returning early if it dies
+        
+        For input that may leave the transport out of sync, where no reply
+        can be waited for. Polls with a backoff from 1 ms up to 20 ms.
+        """
+        deadline = time.monotonic() + duration
+        delay = 0.001
+        while self.is_alive():
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return True
+            time.sleep(min(delay, remaining))
+            delay = min(delay * 2, 0.02)
+        return False
     
     def is_alive(self):
         """Check if server process is still running"""
-        return self.proc.poll() is None and not self.crashed
+        return not self.crashed and not self._exited()
     
-    def get_stderr(self):
-        """Get stderr output"""
+    def _exited(self):
+        """Check whether the server has exited, without reaping it
+        
+        waitid() with WNOWAIT only peeks at the child's state, so it skips
+        the lock and bookkeeping of Popen.poll() on this hot path and leaves
+        the exit status for shutdown() to collect.
+        """
+        if self.proc.returncode is not None:
+            return True
+        if not hasattr(os, "waitid"):  # not on every platform
+            return self.proc.poll() is not None
         try:
-            return self.proc.stderr.read().decode('utf-8', errors='replace')
-        except:
-            return ""
+            return os.waitid(os.P_PID, self.proc.pid,
+                             os.WEXITED | os.WNOHANG | os.WNOWAIT) is not None
+        except ChildProcessError:
+            return True
+    
+    def _drain_stderr(self):
+        """Read stderr until EOF, keeping only its tail"""
+        fd = self.proc.stderr.fileno()
+        while True:
+            try:
+                chunk = os.read(fd, 4096)
+            except OSError:
+                return
+            if not chunk:
+                return
+            self._stderr_tail.extend(chunk)
+            del self._stderr_tail[:-STDERR_TAIL]
+    
+    def get_stderr(self):
+        """Get the tail of stderr output seen so far (never blocks)"""
+        return bytes(self._stderr_tail).decode('utf-8', errors='replace')
     
     def shutdown(self):
         """Gracefully shutdown the server"""
+        self._outq.put(None)
         try:
             self.proc.terminate()
             self.proc.wait(timeout=2)
         except:
             self.proc.kill()
 
-class TestRunner:
-    def __init__(self):
-        self.tests_run = 0
-        self.tests_passed = 0
-        self.tests_failed = 0
-        
-    def run_test(self, name, test_func):
-        """Run a single test"""
-        print(f"\n{'='*60}")
-        print(f"TEST: {name}")
-        print('='*60)
-        self.tests_run += 1
-        
-        try:
-            test_func()
-            print(f"✓ PASSED: {name}")
-            self.tests_passed += 1
-            return True
-        except AssertionError as e:
-            print(f"✗ FAILED: {name}")
-            print(f"  Error: {e}")
-            self.tests_failed += 1
-            return False
-        except Exception as e:
-            print(f"✗ ERROR: {name}")
-            print(f"  Exception: {e}")
-            import traceback
-            traceback.print_exc()
-            self.tests_failed += 1
-            return False
-    
-    def summary(self):
-        """Print test summary"""
-        print(f"\n{'='*60}")
-        print(f"TEST SUMMARY")
-        print('='*60)
-        print(f"Total: {self.tests_run}")
-        print(f"Passed: {self.tests_passed} ✓")
-        print(f"Failed: {self.tests_failed} ✗")
-        print('='*60)
-        
-        if self.tests_failed == 0:
-            print("ALL TESTS PASSED! 🎉")
-            return 0
-        else:
-            print(f"SOME TESTS FAILED ({self.tests_failed}/{self.tests_run})")
-            return 1
-
+@pytest.fixture
+def client():
+    """A fresh, initialized server per scenario, since a scenario may crash it
+    
+    The handshake is not awaited: the scenario's own messages queue up
+    behind it, and every scenario waits for a reply or checks that the
+    server is alive anyway. Only test_basic_initialization checks the
+    handshake itself.
+    """
+    client = LSPClient()
+    try:
+        client.begin_init()
+        yield client
+    finally:
+        client.shutdown()
 
 # =============================================================================
 # TEST SCENARIOS
@@ -140,435 +391,235 @@ def test_basic_initialization():
     client = LSPClient()
     
     try:
-        # Initialize
-        client.send_message("initialize", {
-            "processId": os.getpid(),
-            "rootUri": f"file://{os.getcwd()}",
-            "capabilities": {}
-        })
-        
-        time.sleep(0.5)
-        assert client.is_alive(), "Server crashed during initialization"
-        
-        # Send initialized notification
-        client.send_message("initialized", {}, is_notification=True)
+        # Not the fixture: the handshake itself is what is tested here
+        assert client.init_sync() is not None, "Server crashed during initialization"
         
-        time.sleep(0.5)
-        assert client.is_alive(), "Server crashed after initialized"
+        assert client.roundtrip(), "Server crashed or stopped answering after initialized"
         
     finally:
         client.shutdown()
 
 
-def test_concurrent_requests():
+def test_concurrent_requests(client):
     """Test multiple concurrent requests don't cause crashes"""
-    client = LSPClient()
+    # Every hover has the same params, so they are serialized once;
+    # only the id differs between the framed messages
+    hover_params = json.dumps({
+        "textDocument": {"uri": "file:///tmp/test.jazz"},
+        "position": {"line": 0, "character": 0}
+    }).encode('utf-8')
     
-    try:
-        # Initialize first
-        client.send_message("initialize", {
-            "processId": os.getpid(),
-            "rootUri": f"file://{os.getcwd()}",
-            "capabilities": {}
-        })
-        time.sleep(0.5)
-        client.send_message("initialized", {}, is_notification=True)
-        time.sleep(0.5)
-        
-        # Send multiple requests concurrently
-        def send_hover_request():
-            for _ in range(5):
-                client.send_message("textDocument/hover", {
-                    "textDocument": {"uri": "file:///tmp/test.jazz"},
-                    "position": {"line": 0, "character": 0}
-                })
-                time.sleep(0.01)
-        
-        threads = []
-        for _ in range(3):
-            t = threading.Thread(target=send_hover_request)
-            t.start()
-            threads.append(t)
-        
-        for t in threads:
-            t.join()
-        
-        time.sleep(0.5)
-        assert client.is_alive(), "Server crashed during concurrent requests"
-        
-    finally:
-        client.shutdown()
+    # Keep 15 requests in flight at once; one write puts them all in the
+    # server's input before it has answered the first
+    ids = client.send_batch([("textDocument/hover", hover_params, False)] * 15)
+    
+    # Replies come in order, so once the last one is in, all are
+    if ids:
+        client.wait_for_response(ids[-1])
+    
+    assert client.is_alive(), "Server crashed during concurrent requests"
 
 
-def test_rapid_document_changes():
+def test_rapid_document_changes(client):
     """Test rapid document open/change/close doesn't crash"""
-    client = LSPClient()
-    
-    try:
-        # Initialize
-        client.send_message("initialize", {
-            "processId": os.getpid(),
-            "rootUri": f"file://{os.getcwd()}",
-            "capabilities": {}
-        })
-        time.sleep(0.5)
-        client.send_message("initialized", {}, is_notification=True)
-        time.sleep(0.5)
-        
-        # Rapidly open, change, and close documents
-        for i in range(10):
-            uri = f"file:///tmp/test{i}.jazz"
-            
-            # Open
-            client.send_message("textDocument/didOpen", {
-                "textDocument": {
-                    "uri": uri,
-                    "languageId": "jasmin",
-                    "version": 1,
-                    "text": "fn test() { }"
-                }
-            }, is_notification=True)
-            
-            # Change multiple times
-            for v in range(2, 5):
-                client.send_message("textDocument/didChange", {
-                    "textDocument": {"uri": uri, "version": v},
-                    "contentChanges": [{"text": f"fn test{v}() {{ }}"}]
-                }, is_notification=True)
-            
-            # Close
-            client.send_message("textDocument/didClose", {
-                "textDocument": {"uri": uri}
-            }, is_notification=True)
-            
-            time.sleep(0.05)
-        
-        time.sleep(0.5)
-        assert client.is_alive(), "Server crashed during rapid document changes"
+    # Rapidly open, change, and close documents, all in one write
+    messages = []
+    for i in range(10):
+        uri = f"file:///tmp/test{i}.jazz"
         
-    finally:
-        client.shutdown()
+        # Open
+        messages.append(("textDocument/didOpen", {
+            "textDocument": {
+                "uri": uri,
+                "languageId": "jasmin",
+                "version": 1,
+                "text": "fn test() { }"
+            }
+        }, True))
+        
+        # Change multiple times
+        for v in range(2, 5):
+            messages.append(("textDocument/didChange", {
+                "textDocument": {"uri": uri, "version": v},
+                "contentChanges": [{"text": f"fn test{v}() {{ }}"}]
+            }, True))
+        
+        # Close
+        messages.append(("textDocument/didClose", {
+            "textDocument": {"uri": uri}
+        }, True))
+    client.send_batch(messages)
+    
+    assert client.roundtrip(), "Server crashed or stopped answering during rapid document changes"
 
 
-def test_invalid_json():
+def test_invalid_json(client):
     """Test that malformed JSON doesn't crash the server"""
-    client = LSPClient()
+    # Send invalid JSON (missing closing brace)
+    invalid_content = 'Content-Length: 50\r\n\r\n{"jsonrpc": "2.0", "method": "test"'
+    client.send_raw(invalid_content.encode('utf-8'))
     
-    try:
-        # Initialize normally first
-        client.send_message("initialize", {
-            "processId": os.getpid(),
-            "rootUri": f"file://{os.getcwd()}",
-            "capabilities": {}
-        })
-        time.sleep(0.5)
-        client.send_message("initialized", {}, is_notification=True)
-        time.sleep(0.5)
-        
-        # Send invalid JSON (missing closing brace)
-        invalid_content = 'Content-Length: 50\r\n\r\n{"jsonrpc": "2.0", "method": "test"'
-        try:
-            client.proc.stdin.write(invalid_content.encode('utf-8'))
-            client.proc.stdin.flush()
-        except:
-            pass
-        
-        time.sleep(0.5)
-        assert client.is_alive(), "Server crashed on invalid JSON"
-        
-        # Server should still be able to process valid requests
-        client.send_message("textDocument/hover", {
-            "textDocument": {"uri": "file:///tmp/test.jazz"},
-            "position": {"line": 0, "character": 0}
-        })
-        
-        time.sleep(0.5)
-        assert client.is_alive(), "Server crashed after recovering from invalid JSON"
-        
-    finally:
-        client.shutdown()
+    # The frame is shorter than announced, so the server may swallow the
+    # start of the next message; no reply can be relied on
+    client.wait_for_idle(0.5)
+    assert client.is_alive(), "Server crashed on invalid JSON"
+    
+    # Server should still be able to process valid requests
+    client.send_message("textDocument/hover", {
+        "textDocument": {"uri": "file:///tmp/test.jazz"},
+        "position": {"line": 0, "character": 0}
+    })
+    
+    client.wait_for_idle(0.5)
+    assert client.is_alive(), "Server crashed after recovering from invalid JSON"
 
 
-def test_invalid_utf8():
+def test_invalid_utf8(client):
     """Test that invalid UTF-8 doesn't crash the server"""
-    client = LSPClient()
+    # Open document with invalid UTF-8 sequences
+    client.send_message("textDocument/didOpen", {
+        "textDocument": {
+            "uri": "file:///tmp/invalid_utf8.jazz",
+            "languageId": "jasmin",
+            "version": 1,
+            "text": "fn test() { /* \xff\xfe Invalid UTF-8 */ }"
+        }
+    }, is_notification=True)
     
-    try:
-        # Initialize
-        client.send_message("initialize", {
-            "processId": os.getpid(),
-            "rootUri": f"file://{os.getcwd()}",
-            "capabilities": {}
-        })
-        time.sleep(0.5)
-        client.send_message("initialized", {}, is_notification=True)
-        time.sleep(0.5)
-        
-        # Open document with invalid UTF-8 sequences
-        client.send_message("textDocument/didOpen", {
-            "textDocument": {
-                "uri": "file:///tmp/invalid_utf8.jazz",
-                "languageId": "jasmin",
-                "version": 1,
-                "text": "fn test() { /* \xff\xfe Invalid UTF-8 */ }"
-            }
-        }, is_notification=True)
-        
-        time.sleep(0.5)
-        assert client.is_alive(), "Server crashed on invalid UTF-8"
-        
-    finally:
-        client.shutdown()
+    assert client.roundtrip(), "Server crashed or stopped answering on invalid UTF-8"
 
 
-def test_missing_required_file():
+def test_missing_required_file(client):
     """Test that references to missing files don't crash"""
-    client = LSPClient()
+    # Open document with require to non-existent file
+    client.send_message("textDocument/didOpen", {
+        "textDocument": {
+            "uri": "file:///tmp/with_require.jazz",
+            "languageId": "jasmin",
+            "version": 1,
+            "text": 'require "this_file_does_not_exist.jazz"\n\nfn test() { }'
+        }
+    }, is_notification=True)
     
-    try:
-        # Initialize
-        client.send_message("initialize", {
-            "processId": os.getpid(),
-            "rootUri": f"file://{os.getcwd()}",
-            "capabilities": {}
-        })
-        time.sleep(0.5)
-        client.send_message("initialized", {}, is_notification=True)
-        time.sleep(0.5)
-        
-        # Open document with require to non-existent file
-        client.send_message("textDocument/didOpen", {
-            "textDocument": {
-                "uri": "file:///tmp/with_require.jazz",
-                "languageId": "jasmin",
-                "version": 1,
-                "text": 'require "this_file_does_not_exist.jazz"\n\nfn test() { }'
-            }
-        }, is_notification=True)
-        
-        time.sleep(0.5)
-        assert client.is_alive(), "Server crashed on missing required file"
-        
-        # Try to get definition on the require statement
-        client.send_message("textDocument/definition", {
-            "textDocument": {"uri": "file:///tmp/with_require.jazz"},
-            "position": {"line": 0, "character": 10}
-        })
-        
-        time.sleep(0.5)
-        assert client.is_alive(), "Server crashed trying to resolve missing file"
-        
-    finally:
-        client.shutdown()
+    assert client.roundtrip(), "Server crashed or stopped answering on missing required file"
+    
+    # Try to get definition on the require statement
+    client.send_message("textDocument/definition", {
+        "textDocument": {"uri": "file:///tmp/with_require.jazz"},
+        "position": {"line": 0, "character": 10}
+    })
+    
+    assert client.roundtrip(), "Server crashed or stopped answering trying to resolve missing file"
+
 
+@functools.lru_cache(maxsize=1)
+def large_document_params():
+    """didOpen params of a large document (10000 lines), serialized once per process"""
+    text = "\n".join(
+        f"fn function_{i}(x: u64) -> u64 {{ return x + {i}; }}" for i in range(10000)
+    )
+    params = {
+        "textDocument": {
+            "uri": "file:///tmp/large.jazz",
+            "languageId": "jasmin",
+            "version": 1,
+            "text": text
+        }
+    }
+    return orjson.dumps(params) if orjson else json.dumps(params).encode('utf-8')
 
-def test_large_document():
+
+def test_large_document(client):
     """Test that large documents don't cause crashes"""
-    client = LSPClient()
+    client.send_message("textDocument/didOpen", large_document_params(), is_notification=True)
     
-    try:
-        # Initialize
-        client.send_message("initialize", {
-            "processId": os.getpid(),
-            "rootUri": f"file://{os.getcwd()}",
-            "capabilities": {}
-        })
-        time.sleep(0.5)
-        client.send_message("initialized", {}, is_notification=True)
-        time.sleep(0.5)
-        
-        # Generate a large document (10000 lines)
-        lines = []
-        for i in range(10000):
-            lines.append(f"fn function_{i}(x: u64) -> u64 {{ return x + {i}; }}")
-        large_text = "\n".join(lines)
-        
-        client.send_message("textDocument/didOpen", {
-            "textDocument": {
-                "uri": "file:///tmp/large.jazz",
-                "languageId": "jasmin",
-                "version": 1,
-                "text": large_text
-            }
-        }, is_notification=True)
-        
-        time.sleep(2.0)  # Give it time to parse
-        assert client.is_alive(), "Server crashed on large document"
-        
-    finally:
-        client.shutdown()
+    # Diagnostics for the document are published once it is parsed, which
+    # takes a while
+    client.wait_for_notification(
+        "textDocument/publishDiagnostics",
+        match=lambda params: params["uri"] == "file:///tmp/large.jazz",
+        timeout=30.0
+    )
+    assert client.is_alive(), "Server crashed on large document"
 
 
-def test_syntax_errors():
+@pytest.mark.parametrize("text", [
+    pytest.param("fn test( { }", id="missing-param"),
+    pytest.param("fn { }", id="missing-name"),
+    pytest.param("fn test() -> { }", id="missing-return-type"),
+    pytest.param("fn test() { return; }", id="incomplete-return"),
+    pytest.param("[[[[[[[[[[", id="unmatched-brackets"),
+    pytest.param("fn test() { fn nested() { } }", id="nested-function"),  # might be invalid
+])
+def test_syntax_errors(client, text):
     """Test that syntax errors don't crash the server"""
-    client = LSPClient()
+    client.send_message("textDocument/didOpen", {
+        "textDocument": {
+            "uri": "file:///tmp/error.jazz",
+            "languageId": "jasmin",
+            "version": 1,
+            "text": text
+        }
+    }, is_notification=True)
     
-    try:
-        # Initialize
-        client.send_message("initialize", {
-            "processId": os.getpid(),
-            "rootUri": f"file://{os.getcwd()}",
-            "capabilities": {}
-        })
-        time.sleep(0.5)
-        client.send_message("initialized", {}, is_notification=True)
-        time.sleep(0.5)
-        
-        # Various syntax errors
-        syntax_errors = [
-            "fn test( { }",  # Missing param
-            "fn { }",  # Missing name
-            "fn test() -> { }",  # Missing return type
-            "fn test() { return; }",  # Incomplete return
-            "[[[[[[[[[[",  # Unmatched brackets
-            "fn test() { fn nested() { } }",  # Nested function (might be invalid)
-        ]
-        
-        for i, text in enumerate(syntax_errors):
-            client.send_message("textDocument/didOpen", {
-                "textDocument": {
-                    "uri": f"file:///tmp/error{i}.jazz",
-                    "languageId": "jasmin",
-                    "version": 1,
-                    "text": text
-                }
-            }, is_notification=True)
-            
-            time.sleep(0.1)
-            assert client.is_alive(), f"Server crashed on syntax error: {text}"
-        
-    finally:
-        client.shutdown()
+    assert client.roundtrip(), f"Server crashed or stopped answering on syntax error: {text}"
 
 
-def test_recursive_requires():
+def test_recursive_requires(client):
     """Test that circular require dependencies don't cause infinite loops"""
-    client = LSPClient()
+    # Open file A that requires B
+    client.send_message("textDocument/didOpen", {
+        "textDocument": {
+            "uri": "file:///tmp/a.jazz",
+            "languageId": "jasmin",
+            "version": 1,
+            "text": 'require "b.jazz"\nfn a() { }'
+        }
+    }, is_notification=True)
     
-    try:
-        # Initialize
-        client.send_message("initialize", {
-            "processId": os.getpid(),
-            "rootUri": f"file://{os.getcwd()}",
-            "capabilities": {}
-        })
-        time.sleep(0.5)
-        client.send_message("initialized", {}, is_notification=True)
-        time.sleep(0.5)
-        
-        # Open file A that requires B
-        client.send_message("textDocument/didOpen", {
-            "textDocument": {
-                "uri": "file:///tmp/a.jazz",
-                "languageId": "jasmin",
-                "version": 1,
-                "text": 'require "b.jazz"\nfn a() { }'
-            }
-        }, is_notification=True)
-        
-        # Open file B that requires A (circular)
-        client.send_message("textDocument/didOpen", {
-            "textDocument": {
-                "uri": "file:///tmp/b.jazz",
-                "languageId": "jasmin",
-                "version": 1,
-                "text": 'require "a.jazz"\nfn b() { }'
-            }
-        }, is_notification=True)
-        
-        time.sleep(0.5)
-        assert client.is_alive(), "Server crashed on circular requires"
-        
-        # Try operations that traverse dependencies
-        client.send_message("textDocument/definition", {
-            "textDocument": {"uri": "file:///tmp/a.jazz"},
-            "position": {"line": 1, "character": 3}
-        })
-        
-        time.sleep(1.0)
-        assert client.is_alive(), "Server hung/crashed on circular require traversal"
-        
-    finally:
-        client.shutdown()
+    # Open file B that requires A (circular)
+    client.send_message("textDocument/didOpen", {
+        "textDocument": {
+            "uri": "file:///tmp/b.jazz",
+            "languageId": "jasmin",
+            "version": 1,
+            "text": 'require "a.jazz"\nfn b() { }'
+        }
+    }, is_notification=True)
+    
+    assert client.roundtrip(), "Server crashed or stopped answering on circular requires"
+    
+    # Try operations that traverse dependencies
+    client.send_message("textDocument/definition", {
+        "textDocument": {"uri": "file:///tmp/a.jazz"},
+        "position": {"line": 1, "character": 3}
+    })
+    
+    assert client.roundtrip(), "Server hung/crashed on circular require traversal"
 
 
-def test_null_and_boundary_values():
+@pytest.mark.parametrize("position", [
+    pytest.param(None, id="empty-document"),
+    pytest.param((0, 0), id="hover-at-origin"),
+    pytest.param((999999, 999999), id="hover-out-of-bounds"),
+])
+def test_null_and_boundary_values(client, position):
     """Test edge cases with null/empty values"""
-    client = LSPClient()
+    # Empty document
+    client.send_message("textDocument/didOpen", {
+        "textDocument": {
+            "uri": "file:///tmp/empty.jazz",
+            "languageId": "jasmin",
+            "version": 1,
+            "text": ""
+        }
+    }, is_notification=True)
     
-    try:
-        # Initialize
-        client.send_message("initialize", {
-            "processId": os.getpid(),
-            "rootUri": f"file://{os.getcwd()}",
-            "capabilities": {}
-        })
-        time.sleep(0.5)
-        client.send_message("initialized", {}, is_notification=True)
-        time.sleep(0.5)
-        
-        # Empty document
-        client.send_message("textDocument/didOpen", {
-            "textDocument": {
-                "uri": "file:///tmp/empty.jazz",
-                "languageId": "jasmin",
-                "version": 1,
-                "text": ""
-            }
-        }, is_notification=True)
-        
-        time.sleep(0.3)
-        assert client.is_alive(), "Server crashed on empty document"
-        
-        # Position at end of empty document
+    if position is not None:
+        line, character = position
         client.send_message("textDocument/hover", {
             "textDocument": {"uri": "file:///tmp/empty.jazz"},
-            "position": {"line": 0, "character": 0}
+            "position": {"line": line, "character": character}
         })
-        
-        time.sleep(0.3)
-        assert client.is_alive(), "Server crashed on hover at position 0,0 in empty doc"
-        
-        # Very large position values
-        client.send_message("textDocument/hover", {
-            "textDocument": {"uri": "file:///tmp/empty.jazz"},
-            "position": {"line": 999999, "character": 999999}
-        })
-        
-        time.sleep(0.3)
-        assert client.is_alive(), "Server crashed on out-of-bounds position"
-        
-    finally:
-        client.shutdown()
-
-
-# =============================================================================
-# MAIN
-# =============================================================================
-
-def main():
-    """Run all crash tests"""
-    if not os.path.exists(SERVER):
-        print(f"ERROR: Server executable not found at {SERVER}")
-        print("Please build the server first with: dune build")
-        return 1
-    
-    runner = TestRunner()
     
-    # Run all tests
-    runner.run_test("Basic Initialization", test_basic_initialization)
-    runner.run_test("Concurrent Requests", test_concurrent_requests)
-    runner.run_test("Rapid Document Changes", test_rapid_document_changes)
-    runner.run_test("Invalid JSON", test_invalid_json)
-    runner.run_test("Invalid UTF-8", test_invalid_utf8)
-    runner.run_test("Missing Required File", test_missing_required_file)
-    runner.run_test("Large Document", test_large_document)
-    runner.run_test("Syntax Errors", test_syntax_errors)
-    runner.run_test("Recursive Requires", test_recursive_requires)
-    runner.run_test("Null and Boundary Values", test_null_and_boundary_values)
-    
-    return runner.summary()
-
-
-if __name__ == "__main__":
-    sys.exit(main())
+    assert client.roundtrip(), f"Server crashed or stopped answering on empty document (hover at {position})"
@@ -3,231 +3,69 @@
 Test for multi-file project with requires - simulates the real crash scenario.
 """
 
-import subprocess
-import json
-import time
-import os
-import sys
-import tempfile
-import shutil
+from pathlib import Path
 
-SERVER = "_build/default/jasmin-lsp/jasmin_lsp.exe"
+import pytest
 
-def test_multi_file_project():
+# A project whose main file requires the other two, read once at import
+PROJECT_DIR = Path(__file__).resolve().parent.parent / "fixtures" / "multi_file"
+PARAMS_FILE = PROJECT_DIR / "params.jinc"
+ETA_FILE = PROJECT_DIR / "eta.jinc"
+MAIN_FILE = PROJECT_DIR / "main.jazz"
+PARAMS_TEXT = PARAMS_FILE.read_text()
+ETA_TEXT = ETA_FILE.read_text()
+MAIN_TEXT = MAIN_FILE.read_text()
+
+# Position of ETA in "x = ETA;" in eta.jinc, where hovering used to crash
+ETA_LINE, ETA_CHAR = next(
+    (i, line.index("ETA")) for i, line in enumerate(ETA_TEXT.splitlines()) if "x = ETA" in line
+)
+
+def test_multi_file_project(isolated_lsp_client):
     """Test with multiple files and require statements"""
     print("Testing multi-file project with requires...")
     
-    # Create temp directory with test files
-    tmpdir = tempfile.mkdtemp()
+    # A server of its own, since the scenario may crash it. Every step waits
+    # for the server's reply rather than for a fixed delay: a reply that
+    # never comes (None) means the server died or hung.
+    client = isolated_lsp_client
     
-    try:
-        # Create test files
-        params_file = os.path.join(tmpdir, "params.jinc")
-        with open(params_file, 'w') as f:
-            f.write('param int ETA = 2;\nparam int K = 4;\n')
-        
-        eta_file = os.path.join(tmpdir, "eta.jinc")
-        with open(eta_file, 'w') as f:
-            f.write('require "params.jinc"\n\nfn pack_eta() {\n  reg u64 x;\n  x = ETA;\n}\n')
-        
-        main_file = os.path.join(tmpdir, "main.jazz")
-        with open(main_file, 'w') as f:
-            f.write(f'''require "{os.path.basename(params_file)}"
-require "{os.path.basename(eta_file)}"
-
-fn main() {{
-  pack_eta();
-}}
-''')
-        
-        # Start server
-        proc = subprocess.Popen(
-            [SERVER],
-            stdin=subprocess.PIPE,
-            stdout=subprocess.PIPE,
-            stderr=subprocess.PIPE,
-            bufsize=0
-        )
-        
-        msg_id = 0
-        
-        def send(method, params=None, is_notification=False):
-            nonlocal msg_id
-            msg = {"jsonrpc": "2.0", "method": method}
-            
-            if not is_notification:
-                msg_id += 1
-                msg["id"] = msg_id
-            
-            if params:
-                msg["params"] = params
-            
-            msg_str = json.dumps(msg)
-            content = f"Content-Length: {len(msg_str)}\r\n\r\n{msg_str}"
-            
-            try:
-                proc.stdin.write(content.encode('utf-8'))
-                proc.stdin.flush()
-                return True
-            except:
-                return False
-        
-        # Initialize
-        send("initialize", {
-            "processId": os.getpid(),
-            "rootUri": f"file://{tmpdir}",
-            "capabilities": {}
-        })
-        time.sleep(0.3)
-        
-        if proc.poll() is not None:
-            print("✗ CRASH during initialization!")
-            return False
-        
-        send("initialized", {}, is_notification=True)
-        time.sleep(0.3)
-        
-        # Open main file (which requires other files)
-        main_uri = f"file://{main_file}"
-        with open(main_file, 'r') as f:
-            main_content = f.read()
-        
-        print(f"  Opening main file...")
-        send("textDocument/didOpen", {
-            "textDocument": {
-                "uri": main_uri,
-                "languageId": "jasmin",
-                "version": 1,
-                "text": main_content
-            }
-        }, is_notification=True)
-        
-        time.sleep(0.5)
-        
-        if proc.poll() is not None:
-            print("✗ CRASH after opening main file!")
-            stderr = proc.stderr.read().decode('utf-8', errors='replace')
-            print("=== STDERR ===")
-            print(stderr[-3000:])
-            return False
-        
-        print(f"  Main file opened")
-        
-        # Open eta file
-        eta_uri = f"file://{eta_file}"
-        with open(eta_file, 'r') as f:
-            eta_content = f.read()
-        
-        print(f"  Opening eta file...")
-        send("textDocument/didOpen", {
-            "textDocument": {
-                "uri": eta_uri,
-                "languageId": "jasmin",
-                "version": 1,
-                "text": eta_content
-            }
-        }, is_notification=True)
-        
-        time.sleep(0.5)
-        
-        if proc.poll() is not None:
-            print("✗ CRASH after opening eta file!")
-            stderr = proc.stderr.read().decode('utf-8', errors='replace')
-            print("=== STDERR ===")
-            print(stderr[-3000:])
-            return False
-        
-        print(f"  Eta file opened")
-        
-        # Open params file
-        params_uri = f"file://{params_file}"
-        with open(params_file, 'r') as f:
-            params_content = f.read()
-        
-        print(f"  Opening params file...")
-        send("textDocument/didOpen", {
-            "textDocument": {
-                "uri": params_uri,
-                "languageId": "jasmin",
-                "version": 1,
-                "text": params_content
-            }
-        }, is_notification=True)
-        
-        time.sleep(0.5)
-        
-        if proc.poll() is not None:
-            print("✗ CRASH after opening params file!")
-            stderr = proc.stderr.read().decode('utf-8', errors='replace')
-            print("=== STDERR ===")
-            print(stderr[-3000:])
-            return False
-        
-        print(f"  Params file opened")
-        
-        # Request document symbols (this triggered the crash)
-        print(f"  Requesting document symbols...")
-        send("textDocument/documentSymbol", {
-            "textDocument": {"uri": eta_uri}
-        })
-        
-        time.sleep(0.5)
-        
-        if proc.poll() is not None:
-            print("✗ CRASH after documentSymbol request!")
-            stderr = proc.stderr.read().decode('utf-8', errors='replace')
-            print("=== STDERR ===")
-            print(stderr[-3000:])
-            return False
-        
-        # Request hover on ETA (this also triggered the crash)
-        print(f"  Requesting hover on ETA...")
-        # Find line with ETA
-        lines = eta_content.split('\n')
-        eta_line = -1
-        eta_char = -1
-        for i, line in enumerate(lines):
-            if 'ETA' in line and 'x = ETA' in line:
-                eta_line = i
-                eta_char = line.index('ETA')
-                break
-        
-        if eta_line >= 0:
-            send("textDocument/hover", {
-                "textDocument": {"uri": eta_uri},
-                "position": {"line": eta_line, "character": eta_char}
-            })
-            
-            time.sleep(0.5)
-            
-            if proc.poll() is not None:
-                print("✗ CRASH after hover request on ETA!")
-                stderr = proc.stderr.read().decode('utf-8', errors='replace')
-                print("=== STDERR ===")
-                print(stderr[-3000:])
-                return False
-        
-        print("✓ Multi-file project test passed!")
-        
-        proc.terminate()
-        proc.wait(timeout=2)
-        return True
-        
-    except Exception as e:
-        print(f"Exception: {e}")
-        import traceback
-        traceback.print_exc()
-        return False
-        
-    finally:
-        try:
-            proc.kill()
-        except:
-            pass
-        
-        # Cleanup temp directory
-        shutil.rmtree(tmpdir, ignore_errors=True)
-
-if __name__ == "__main__":
-    success = test_multi_file_project()
-    sys.exit(0 if success else 1)
+    def check_alive(step, reply=True):
+        if reply is None or not client.is_alive():
+            stderr = client.get_stderr()
+            pytest.fail(f"CRASH after {step}!\n=== STDERR ===\n{stderr[-3000:]}")
+    
+    # Initialize
+    check_alive("initialization", client.initialize(PROJECT_DIR.as_uri()))
+    
+    # Open main file (which requires other files); open_document() returns
+    # once the server has processed it
+    main_uri = MAIN_FILE.as_uri()
+    print(f"  Opening main file...")
+    client.open_document(main_uri, MAIN_TEXT)
+    check_alive("opening main file")
+    print(f"  Main file opened")
+    
+    # Open eta file
+    eta_uri = ETA_FILE.as_uri()
+    print(f"  Opening eta file...")
+    client.open_document(eta_uri, ETA_TEXT)
+    check_alive("opening eta file")
+    print(f"  Eta file opened")
+    
+    # Open params file
+    params_uri = PARAMS_FILE.as_uri()
+    print(f"  Opening params file...")
+    client.open_document(params_uri, PARAMS_TEXT)
+    check_alive("opening params file")
+    print(f"  Params file opened")
+    
+    # Request document symbols (this triggered the crash)
+    print(f"  Requesting document symbols...")
+    check_alive("documentSymbol request", client.document_symbols(eta_uri))
+    
+    # Request hover on ETA (this also triggered the crash)
+    print(f"  Requesting hover on ETA...")
+    check_alive("hover request on ETA", client.hover(eta_uri, ETA_LINE, ETA_CHAR))
+    
+    print("✓ Multi-file project test passed!")
@@ -24,13 +24,13 @@ def send_message(proc, method, params=None, is_notification=False, msg_id=None):
     if params is not None:
         msg["params"] = params
     
-    msg_str = json.dumps(msg)
-    content = f"Content-Length: {len(msg_str)}\r\n\r\n{msg_str}"
+    body = json.dumps(msg, ensure_ascii=True).encode('ascii')
+    content = b"Content-Length: %d\r\n\r\n" % len(body) + body
     
     print(f">>> {method} (id={msg_id}, notif={is_notification})")
     
     try:
-        proc.stdin.write(content.encode('utf-8'))
+        proc.stdin.write(content)
         proc.stdin.flush()
         return True
     except Exception as e:
@@ -42,8 +42,7 @@ def main():
         [SERVER],
         stdin=subprocess.PIPE,
         stdout=subprocess.PIPE,
-        stderr=subprocess.PIPE,
-        bufsize=0
+        stderr=subprocess.PIPE
     )
     
     msg_id = 0
@@ -4,158 +4,113 @@ Crash and robustness tests - testing server stability under adverse conditions.
 
 import pytest
 import time
-from conftest import LSPClient, LSP_SERVER
 
 
-def test_server_survives_invalid_json():
+@pytest.fixture(scope="session")
+def large_jazz_doc():
+    """A 1000-function document, built once per session."""
+    return "".join(f"fn func_{i}(reg u64 x) -> reg u64 {{ return x; }}\n" for i in range(1000))
+
+
+def test_server_survives_invalid_json(isolated_lsp_client):
     """Test that server handles invalid JSON gracefully."""
-    client = LSPClient(LSP_SERVER)
-    client.start()
-    
-    try:
-        # Send invalid JSON with correct Content-Length
-        invalid_json = b"{invalid json here}"
-        content_length = len(invalid_json)
-        client.process.stdin.write(f"Content-Length: {content_length}\r\n\r\n".encode('utf-8'))
-        client.process.stdin.write(invalid_json)
-        client.process.stdin.flush()
-        
-        time.sleep(0.5)
-        
-        # Server should still be alive
-        assert client.is_alive(), "Server should survive invalid JSON"
-        
-        # Should still be able to initialize after invalid JSON
-        client.initialize()
-        assert client.initialized, "Server should be able to initialize after error"
-        
-    finally:
-        client.stop()
+    client = isolated_lsp_client
+    
+    # Send invalid JSON with correct Content-Length
+    invalid_json = b"{invalid json here}"
+    content_length = len(invalid_json)
+    client.process.stdin.write(f"Content-Length: {content_length}\r\n\r\n".encode('utf-8'))
+    client.process.stdin.write(invalid_json)
+    client.process.stdin.flush()
+    
+    # Should still be able to initialize after invalid JSON; messages are
+    # handled in order, so the reply also means the bad one was processed
+    client.initialize()
+    
+    # Server should still be alive
+    assert client.is_alive(), "Server should survive invalid JSON"
+    assert client.initialized, "Server should be able to initialize after error"
 
 
-def test_server_handles_missing_required_fields():
+def test_server_handles_missing_required_fields(lsp_client):
     """Test that server handles requests with missing required fields."""
-    client = LSPClient(LSP_SERVER)
-    client.start()
-    client.initialize()
+    # Send textDocument/hover without required fields
+    req_id = lsp_client.send_request("textDocument/hover", {"textDocument": {}})
+    lsp_client.read_response(expect_id=req_id)
     
-    try:
-        # Send textDocument/hover without required fields
-        client.send_request("textDocument/hover", {"textDocument": {}})
-        time.sleep(0.3)
-        
-        # Server should still be alive
-        assert client.is_alive(), "Server should handle invalid requests"
-        
-    finally:
-        client.stop()
+    # Server should still be alive
+    assert lsp_client.is_alive(), "Server should handle invalid requests"
 
 
-def test_server_handles_large_document():
+def test_server_handles_large_document(lsp_client, large_jazz_doc):
     """Test that server can handle very large documents."""
-    client = LSPClient(LSP_SERVER)
-    client.start()
-    client.initialize()
+    uri = "file:///tmp/large.jazz"
+    lsp_client.open_document(uri, large_jazz_doc)
+    
+    # Server should still be alive
+    assert lsp_client.is_alive(), "Server should handle large documents"
     
-    try:
-        # Generate a large document
-        large_code = ""
-        for i in range(1000):
-            large_code += f"fn func_{i}(reg u64 x) -> reg u64 {{ return x; }}\n"
-        
-        uri = "file:///tmp/large.jazz"
-        client.open_document(uri, large_code)
-        
-        time.sleep(0.5)
-        
-        # Server should still be alive
-        assert client.is_alive(), "Server should handle large documents"
-        
-        # Should be able to query the document
-        response = client.hover(uri, line=0, character=3)
-        assert response is not None, "Should respond to hover on large document"
-        
-    finally:
-        client.stop()
+    # Should be able to query the document
+    response = lsp_client.hover(uri, line=0, character=3)
+    assert response is not None, "Should respond to hover on large document"
 
 
-def test_rapid_document_changes():
+def test_rapid_document_changes(lsp_client):
     """Test server stability with rapid document changes."""
-    client = LSPClient(LSP_SERVER)
-    client.start()
-    client.initialize()
+    uri = "file:///tmp/test.jazz"
+    
+    # Open document
+    lsp_client.open_document(uri, "fn test() { }")
     
-    try:
-        uri = "file:///tmp/test.jazz"
-        
-        # Open document
-        client.open_document(uri, "fn test() { }")
-        
-        # Send many rapid changes
-        for i in range(50):
-            client.change_document(uri, f"fn test_{i}() {{ }}", version=i+2)
-            time.sleep(0.01)  # Very short delay
-        
-        time.sleep(0.5)
-        
-        # Server should still be alive
-        assert client.is_alive(), "Server should handle rapid changes"
-        
-    finally:
-        client.stop()
+    # Send many rapid changes (each waits until the server has handled it)
+    for i in range(50):
+        lsp_client.change_document(uri, f"fn test_{i}() {{ }}", version=i+2)
+    
+    # Server should still be alive
+    assert lsp_client.is_alive(), "Server should handle rapid changes"
 
 
-def test_concurrent_hover_requests():
+def test_concurrent_hover_requests(lsp_client):
     """Test that server handles concurrent requests without crashing."""
-    client = LSPClient(LSP_SERVER)
-    client.start()
-    client.initialize()
-    
-    try:
-        uri = "file:///tmp/test.jazz"
-        code = """fn func1() { }
+    uri = "file:///tmp/test.jazz"
+    code = """fn func1() { }
 fn func2() { }
 fn func3() { }
 """
-        client.open_document(uri, code)
-        time.sleep(0.1)
-        
-        # Send multiple hover requests without waiting for responses
-        for i in range(10):
-            client.send_request("textDocument/hover", {
-                "textDocument": {"uri": uri},
-                "position": {"line": i % 3, "character": 3}
-            })
-        
-        time.sleep(1.0)
-        
-        # Server should still be alive
-        assert client.is_alive(), "Server should handle concurrent requests"
-        
-    finally:
-        client.stop()
+    lsp_client.open_document(uri, code)
+    
+    # Send multiple hover requests without waiting for responses
+    req_ids = [
+        lsp_client.send_request("textDocument/hover", {
+            "textDocument": {"uri": uri},
+            "position": {"line": i % 3, "character": 3}
+        })
+        for i in range(10)
+    ]
+    
+    # Then collect the replies
+    for req_id in req_ids:
+        lsp_client.read_response(expect_id=req_id)
+    
+    # Server should still be alive
+    assert lsp_client.is_alive(), "Server should handle concurrent requests"
 
 
-def test_malformed_content_length():
+def test_malformed_content_length(isolated_lsp_client):
     """Test server handles malformed Content-Length headers."""
-    client = LSPClient(LSP_SERVER)
-    client.start()
-    
-    try:
-        # Send request with wrong Content-Length
-        msg = '{"jsonrpc":"2.0","id":1,"method":"initialize","params":{}}'
-        wrong_length = len(msg) + 100  # Intentionally wrong
-        header = f"Content-Length: {wrong_length}\r\n\r\n{msg}"
-        
-        client.process.stdin.write(header.encode('utf-8'))
-        client.process.stdin.flush()
-        
-        time.sleep(1.0)
-        
-        # Server may crash or handle it - we just check it doesn't hang
-        # If it survives, that's good
-        is_alive = client.is_alive()
-        # Either way, test passes (we're testing it doesn't hang forever)
-        
-    finally:
-        client.stop()
+    client = isolated_lsp_client
+    
+    # Send request with wrong Content-Length
+    msg = '{"jsonrpc":"2.0","id":1,"method":"initialize","params":{}}'
+    wrong_length = len(msg) + 100  # Intentionally wrong
+    header = f"Content-Length: {wrong_length}\r\n\r\n{msg}"
+    
+    client.process.stdin.write(header.encode('utf-8'))
+    client.process.stdin.flush()
+    
+    time.sleep(1.0)
+    
+    # Server may crash or handle it - we just check it doesn't hang
+    # If it survives, that's good
+    is_alive = client.is_alive()
+    # Either way, test passes (we're testing it doesn't hang forever)
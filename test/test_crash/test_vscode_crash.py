@@ -6,27 +6,115 @@ Simulates what VSCode does with rapid edits.
 
 import subprocess
 import json
+import tempfile
+import threading
 import time
 import os
 import sys
 
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
 SERVER = "_build/default/jasmin-lsp/jasmin_lsp.exe"
 
-def test_vscode_editing():
-    """Simulate realistic VSCode editing session"""
+# Body of a full-text didChange, filled in with (JSON-encoded uri, version,
+# JSON-encoded text); only the text has to be serialized per edit
+DIDCHANGE_NOTIFICATION = (
+    b'{"jsonrpc":"2.0","method":"textDocument/didChange","params":{'
+    b'"textDocument":{"uri":%s,"version":%d},"contentChanges":[{"text":%s}]}}'
+)
+
+def json_bytes(obj):
+    return orjson.dumps(obj) if orjson else json.dumps(obj).encode('utf-8')
+
+def run_vscode_editing():
+    """Simulate realistic VSCode editing session - returns True if the server survived"""
     print("Simulating VSCode editing session...")
     
+    # stderr goes to a file, which unlike a pipe never fills up and blocks
+    # the server
+    stderr_file = tempfile.TemporaryFile()
     proc = subprocess.Popen(
         [SERVER],
         stdin=subprocess.PIPE,
         stdout=subprocess.PIPE,
-        stderr=subprocess.PIPE,
-        bufsize=0
+        stderr=stderr_file
     )
     
     msg_id = 0
     
-    def send(method, params=None, is_notification=False):
+    # stdout is read as it comes, for the same reason; the messages are kept
+    # in order for wait_for() to look through
+    messages = []
+    arrived = threading.Condition()
+    stdout_closed = False
+    
+    def read_stdout():
+        nonlocal stdout_closed
+        fd = proc.stdout.fileno()
+        buf = bytearray()
+        while True:
+            chunk = os.read(fd, 65536)
+            if not chunk:
+                break
+            buf += chunk
+            parsed = []
+            while True:
+                header_end = buf.find(b"\r\n\r\n")
+                if header_end == -1:
+                    break
+                field = buf.find(b"Content-Length:", 0, header_end)
+                line_end = buf.find(b"\r\n", field)
+                length = int(buf[field + 15:line_end]) if field != -1 else 0
+                body_end = header_end + 4 + length
+                if body_end > len(buf):
+                    break
+                body = bytes(buf[header_end + 4:body_end])
+                parsed.append(orjson.loads(body) if orjson else json.loads(body))
+                del buf[:body_end]
+            with arrived:
+                messages.extend(parsed)
+                arrived.notify_all()
+        with arrived:
+            stdout_closed = True
+            arrived.notify_all()
+    
+    threading.Thread(target=read_stdout, daemon=True).start()
+    cursor = 0
+    
+    def wait_for(predicate, timeout=5.0):
+        """Wait for the next message satisfying predicate; None on timeout or EOF"""
+        nonlocal cursor
+        deadline = time.monotonic() + timeout
+        with arrived:
+            while True:
+                for i in range(cursor, len(messages)):
+                    if predicate(messages[i]):
+                        cursor = i + 1
+                        return messages[i]
+                cursor = len(messages)
+                remaining = deadline - time.monotonic()
+                if stdout_closed or remaining <= 0:
+                    return None
+                arrived.wait(remaining)
+    
+    def response_to(request_id):
+        return lambda msg: msg.get("id") == request_id and "method" not in msg
+    
+    def diagnostics_for(uri):
+        return lambda msg: (msg.get("method") == "textDocument/publishDiagnostics"
+                            and msg["params"]["uri"] == uri)
+    
+    def crashed():
+        return proc.poll() is not None or stdout_closed
+    
+    def server_stderr():
+        stderr_file.seek(0)
+        return stderr_file.read().decode('utf-8', errors='replace')
+    
+    def frame(method, params=None, is_notification=False):
         nonlocal msg_id
         msg = {
             "jsonrpc": "2.0",
@@ -40,16 +128,24 @@ def test_vscode_editing():
         if params:
             msg["params"] = params
         
-        msg_str = json.dumps(msg)
-        content = f"Content-Length: {len(msg_str)}\r\n\r\n{msg_str}"
-        
+        return framed(json_bytes(msg))
+    
+    def framed(body):
+        return b"Content-Length: %d\r\n\r\n" % len(body) + body
+    
+    def write(*frames):
+        """Write the frames to the server's stdin with as few syscalls as the pipe allows"""
+        view = memoryview(b"".join(frames))
         try:
-            proc.stdin.write(content.encode('utf-8'))
-            proc.stdin.flush()
+            while view:
+                view = view[os.write(proc.stdin.fileno(), view):]
             return True
-        except:
+        except OSError:
             return False
     
+    def send(method, params=None, is_notification=False):
+        return write(frame(method, params, is_notification))
+    
     try:
         # Initialize
         send("initialize", {
@@ -64,16 +160,21 @@ def test_vscode_editing():
             }
         })
         
-        time.sleep(0.5)
+        response = wait_for(response_to(msg_id))
         
-        if proc.poll() is not None:
+        if crashed():
             print("✗ CRASH during initialization!")
-            stderr = proc.stderr.read().decode('utf-8', errors='replace')
+            stderr = server_stderr()
+            print(stderr[-2000:])
+            return False
+        
+        if response is None:
+            print("✗ NO RESPONSE to initialize!")
+            stderr = server_stderr()
             print(stderr[-2000:])
             return False
         
         send("initialized", {}, is_notification=True)
-        time.sleep(0.5)
         
         # Open a document
         uri = "file:///tmp/test_vscode.jazz"
@@ -92,11 +193,18 @@ def test_vscode_editing():
             }
         }, is_notification=True)
         
-        time.sleep(0.5)
+        # Every open and change is answered with the document's diagnostics
+        published = wait_for(diagnostics_for(uri))
         
-        if proc.poll() is not None:
+        if crashed():
             print("✗ CRASH after didOpen!")
-            stderr = proc.stderr.read().decode('utf-8', errors='replace')
+            stderr = server_stderr()
+            print(stderr[-2000:])
+            return False
+        
+        if published is None:
+            print("✗ NO DIAGNOSTICS after didOpen!")
+            stderr = server_stderr()
             print(stderr[-2000:])
             return False
         
@@ -111,18 +219,26 @@ def test_vscode_editing():
             "fn test_function(x: u64) -> u64 {\n    reg u64 y;\n    y = x + 1;\n    return y;\n}\n\nfn another(",
         ]
         
-        for i, new_text in enumerate(changes, start=2):
+        # The edits go out back to back in one write, as they do from a fast
+        # typist, and each is then answered with the document's diagnostics
+        uri_json = json_bytes(uri)
+        write(*(framed(DIDCHANGE_NOTIFICATION % (uri_json, i, json_bytes(new_text)))
+                for i, new_text in enumerate(changes, start=2)))
+        
+        for i in range(2, len(changes) + 2):
             print(f"  Change {i}...")
-            send("textDocument/didChange", {
-                "textDocument": {"uri": uri, "version": i},
-                "contentChanges": [{"text": new_text}]
-            }, is_notification=True)
-            
-            time.sleep(0.2)
+            published = wait_for(diagnostics_for(uri))
             
-            if proc.poll() is not None:
+            if crashed():
                 print(f"✗ CRASH after change {i}!")
-                stderr = proc.stderr.read().decode('utf-8', errors='replace')
+                stderr = server_stderr()
+                print("=== STDERR (last 3000 chars) ===")
+                print(stderr[-3000:])
+                return False
+            
+            if published is None:
+                print(f"✗ NO DIAGNOSTICS after change {i}!")
+                stderr = server_stderr()
                 print("=== STDERR (last 3000 chars) ===")
                 print(stderr[-3000:])
                 return False
@@ -137,11 +253,18 @@ def test_vscode_editing():
                 "position": {"line": 0, "character": 3}
             })
             
-            time.sleep(0.3)
+            response = wait_for(response_to(msg_id))
             
-            if proc.poll() is not None:
+            if crashed():
                 print(f"✗ CRASH after hover request {attempt + 1}!")
-                stderr = proc.stderr.read().decode('utf-8', errors='replace')
+                stderr = server_stderr()
+                print("=== STDERR (last 3000 chars) ===")
+                print(stderr[-3000:])
+                return False
+            
+            if response is None:
+                print(f"✗ NO RESPONSE to hover request {attempt + 1}!")
+                stderr = server_stderr()
                 print("=== STDERR (last 3000 chars) ===")
                 print(stderr[-3000:])
                 return False
@@ -153,11 +276,20 @@ def test_vscode_editing():
             "textDocument": {"uri": uri}
         }, is_notification=True)
         
-        time.sleep(0.5)
+        # Messages are handled in order, so the reply to any request means
+        # the close was processed
+        send("textDocument/documentSymbol", {"textDocument": {"uri": uri}})
+        response = wait_for(response_to(msg_id))
         
-        if proc.poll() is not None:
+        if crashed():
             print("✗ CRASH after didClose!")
-            stderr = proc.stderr.read().decode('utf-8', errors='replace')
+            stderr = server_stderr()
+            print(stderr[-2000:])
+            return False
+        
+        if response is None:
+            print("✗ NO RESPONSE after didClose!")
+            stderr = server_stderr()
             print(stderr[-2000:])
             return False
         
@@ -175,7 +307,7 @@ def test_vscode_editing():
         if proc.poll() is None:
             proc.terminate()
         
-        stderr = proc.stderr.read().decode('utf-8', errors='replace')
+        stderr = server_stderr()
         print("=== STDERR ===")
         print(stderr[-3000:])
         return False
@@ -183,9 +315,14 @@ def test_vscode_editing():
     finally:
         try:
             proc.kill()
+            stderr_file.close()
         except:
             pass
 
+def test_vscode_editing():
+    """Test that the server survives a realistic VSCode editing session"""
+    assert run_vscode_editing(), "Server crashed or stopped answering during the VSCode editing session"
+
 if __name__ == "__main__":
-    success = test_vscode_editing()
+    success = run_vscode_editing()
     sys.exit(0 if success else 1)
@@ -7,13 +7,51 @@ The namespace should be treated as a folder name.
 import json
 import subprocess
 import os
+import re
 import tempfile
 import shutil
 
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
 server_path = './_build/default/jasmin-lsp/jasmin_lsp.exe'
 
-def test_from_require():
-    """Test from/require with namespace as folder"""
+# Matches the body of the reply to the definition request (id 2); the
+# server pretty-prints its JSON, hence the optional whitespace
+DEFINITION_REPLY = re.compile(rb'"id"\s*:\s*2\s*[,}]')
+
+def iter_lsp_messages(buf, keep=None):
+    """Yield the JSON-RPC messages framed in buf, in order
+    
+    A single pass: pos moves from frame to frame, so nothing is sliced off
+    and copied. Stops at the first incomplete or malformed frame. When keep
+    is given, only bodies for which keep(body) is true are parsed; the
+    others (diagnostics, logs...) are skipped as raw bytes.
+    """
+    pos = 0
+    while True:
+        start = buf.find(b'Content-Length:', pos)
+        if start == -1:
+            return
+        header_end = buf.find(b'\r\n\r\n', start)
+        if header_end == -1:
+            return
+        try:
+            length = int(buf[start + 15:buf.find(b'\r\n', start)])
+            body_start = header_end + 4
+            if body_start + length > len(buf):
+                return
+            body = buf[body_start:body_start + length]
+            if keep is None or keep(body):
+                yield orjson.loads(body) if orjson else json.loads(body)
+        except (ValueError, json.JSONDecodeError):
+            return
+        pos = body_start + length
+
+def run_from_require():
+    """Test from/require with namespace as folder - returns True if passed"""
     
     # Create temporary directory structure
     with tempfile.TemporaryDirectory() as tmpdir:
@@ -85,12 +123,11 @@ fn main() -> reg u32 {
             }
         ]
         
-        input_data = ''
+        parts = []
         for msg in messages:
-            content = json.dumps(msg)
-            content_bytes = content.encode('utf-8')
-            header = f'Content-Length: {len(content_bytes)}\r\n\r\n'
-            input_data += header + content
+            body = orjson.dumps(msg) if orjson else json.dumps(msg).encode('utf-8')
+            parts.append(b'Content-Length: %d\r\n\r\n' % len(body))
+            parts.append(body)
         
         proc = subprocess.Popen(
             [server_path],
@@ -100,7 +137,7 @@ fn main() -> reg u32 {
         )
         
         try:
-            stdout, stderr = proc.communicate(input=input_data.encode('utf-8'), timeout=10)
+            stdout, stderr = proc.communicate(input=b''.join(parts), timeout=10)
         except subprocess.TimeoutExpired:
             proc.kill()
             proc.communicate()
@@ -115,22 +152,7 @@ fn main() -> reg u32 {
                     proc.kill()
         
         # Parse responses
-        responses = []
-        output = stdout.decode('utf-8', errors='ignore')
-        while 'Content-Length:' in output:
-            try:
-                idx = output.index('Content-Length:')
-                output = output[idx:]
-                header_end = output.index('\r\n\r\n')
-                header = output[:header_end]
-                length_str = header.split(':')[1].strip()
-                length = int(length_str)
-                body_start = header_end + 4
-                body = output[body_start:body_start + length]
-                responses.append(json.loads(body))
-                output = output[body_start + length:]
-            except (ValueError, IndexError, json.JSONDecodeError):
-                break
+        responses = list(iter_lsp_messages(stdout, keep=DEFINITION_REPLY.search))
         
         # Check stderr for logging
         stderr_text = stderr.decode('utf-8', errors='ignore')
@@ -173,12 +195,16 @@ fn main() -> reg u32 {
         print(f"❌ FAIL: No definition response received")
         return False
 
+def test_from_require():
+    """Test: from Common require "poly.jinc" resolves into the Common folder"""
+    assert run_from_require()
+
 if __name__ == "__main__":
     print("Testing 'from Common require \"poly.jinc\"' syntax...")
     print("=" * 70)
     print()
     
-    success = test_from_require()
+    success = run_from_require()
     
     print()
     print("=" * 70)
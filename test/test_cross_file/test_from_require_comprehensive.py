@@ -3,93 +3,53 @@
 Comprehensive test for 'from NAMESPACE require' syntax with various scenarios.
 """
 
-import json
-import subprocess
 import os
-import tempfile
 import pytest
 
-server_path = './_build/default/jasmin-lsp/jasmin_lsp.exe'
+@pytest.fixture(scope="module")
+def scenario_root(tmp_path_factory):
+    """One directory for the module; each scenario builds its tree in a subfolder of it."""
+    return tmp_path_factory.mktemp("from_require")
 
-def run_test_scenario(name, setup_func, test_line, test_char, expected_file_rel):
-    """Generic test scenario - returns True if passed, False otherwise"""
+def run_test_scenario(lsp_client, scenario_root, name, setup_func, test_line, test_char, expected_file_rel):
+    """Generic test scenario - returns True if passed, False otherwise
+    
+    Scenarios share the session's server: the main file is opened on it and
+    closed again when the test ends. Requires are resolved relative to the
+    file, so the scenario's directory need not be the workspace root.
+    """
     print(f"\n{'='*70}")
     print(f"Test: {name}")
     print('='*70)
     
-    with tempfile.TemporaryDirectory() as tmpdir:
-        main_file, expected_file = setup_func(tmpdir)
-        main_uri = f"file://{main_file}"
-        
-        messages = [
-            {'jsonrpc': '2.0', 'id': 1, 'method': 'initialize',
-             'params': {'processId': None, 'rootUri': f'file://{tmpdir}', 'capabilities': {}}},
-            {'jsonrpc': '2.0', 'method': 'initialized', 'params': {}},
-            {'jsonrpc': '2.0', 'method': 'textDocument/didOpen',
-             'params': {'textDocument': {'uri': main_uri, 'languageId': 'jasmin',
-                                         'version': 1, 'text': open(main_file).read()}}},
-            {'jsonrpc': '2.0', 'id': 2, 'method': 'textDocument/definition',
-             'params': {'textDocument': {'uri': main_uri},
-                        'position': {'line': test_line, 'character': test_char}}}
-        ]
-        
-        input_data = ''
-        for msg in messages:
-            content = json.dumps(msg)
-            header = f'Content-Length: {len(content.encode())}\r\n\r\n'
-            input_data += header + content
-        
-        proc = subprocess.Popen([server_path], stdin=subprocess.PIPE,
-                                stdout=subprocess.PIPE, stderr=subprocess.PIPE)
-        try:
-            stdout, stderr = proc.communicate(input=input_data.encode(), timeout=10)
-        except subprocess.TimeoutExpired:
-            proc.kill()
-            proc.communicate()
-            raise
-        finally:
-            # Ensure process is terminated
-            if proc.poll() is None:
-                proc.terminate()
-                try:
-                    proc.wait(timeout=2)
-                except subprocess.TimeoutExpired:
-                    proc.kill()
-        
-        # Parse responses
-        responses = []
-        output = stdout.decode('utf-8', errors='ignore')
-        while 'Content-Length:' in output:
-            try:
-                idx = output.index('Content-Length:')
-                output = output[idx:]
-                header_end = output.index('\r\n\r\n')
-                length = int(output[:header_end].split(':')[1].strip())
-                body = output[header_end+4:header_end+4+length]
-                responses.append(json.loads(body))
-                output = output[header_end+4+length:]
-            except: break
-        
-        # Check result
-        for resp in responses:
-            if 'id' in resp and resp['id'] == 2:
-                if 'result' in resp and resp['result']:
-                    result = resp['result']
-                    if isinstance(result, list) and len(result) > 0:
-                        target_uri = result[0]['uri']
-                        target_file = target_uri.replace('file://', '')
-                        if os.path.samefile(target_file, expected_file):
-                            print(f"✅ PASS: Resolved to {expected_file_rel}")
-                            return True
-                        else:
-                            print(f"❌ FAIL: Wrong file")
-                            print(f"   Expected: {expected_file}")
-                            print(f"   Got: {target_file}")
-                            return False
-                print(f"❌ FAIL: No definition found")
-                return False
+    tmpdir = os.path.join(scenario_root, setup_func.__name__)
+    os.makedirs(tmpdir)
+    
+    # The scenario hands back the main file's text, so it is not read again
+    main_file, expected_file, main_text = setup_func(tmpdir)
+    main_uri = f"file://{main_file}"
+    
+    lsp_client.open_document(main_uri, main_text)
+    resp = lsp_client.definition(main_uri, test_line, test_char)
+    
+    # Check result
+    if resp is None:
         print(f"❌ FAIL: No response")
         return False
+    result = resp.get('result')
+    if isinstance(result, list) and len(result) > 0:
+        target_uri = result[0]['uri']
+        target_file = target_uri.replace('file://', '')
+        if os.path.samefile(target_file, expected_file):
+            print(f"✅ PASS: Resolved to {expected_file_rel}")
+            return True
+        else:
+            print(f"❌ FAIL: Wrong file")
+            print(f"   Expected: {expected_file}")
+            print(f"   Got: {target_file}")
+            return False
+    print(f"❌ FAIL: No definition found")
+    return False
 
 def test1_simple_namespace(tmpdir):
     """from Common require "file.jinc" """
@@ -100,10 +60,11 @@ def test1_simple_namespace(tmpdir):
         f.write('fn poly_add() { }')
     
     main = os.path.join(tmpdir, 'main.jazz')
+    main_text = 'from Common require "poly.jinc"\nfn test() { poly_add(); }'
     with open(main, 'w') as f:
-        f.write('from Common require "poly.jinc"\nfn test() { poly_add(); }')
+        f.write(main_text)
     
-    return main, poly
+    return main, poly, main_text
 
 def test2_nested_path(tmpdir):
     """from Common require "crypto/aes.jinc" """
@@ -114,10 +75,11 @@ def test2_nested_path(tmpdir):
         f.write('fn aes_encrypt() { }')
     
     main = os.path.join(tmpdir, 'main.jazz')
+    main_text = 'from Common require "crypto/aes.jinc"\nfn test() { aes_encrypt(); }'
     with open(main, 'w') as f:
-        f.write('from Common require "crypto/aes.jinc"\nfn test() { aes_encrypt(); }')
+        f.write(main_text)
     
-    return main, aes
+    return main, aes, main_text
 
 def test3_no_namespace(tmpdir):
     """require "file.jinc" (no from clause) """
@@ -126,10 +88,11 @@ def test3_no_namespace(tmpdir):
         f.write('fn poly_add() { }')
     
     main = os.path.join(tmpdir, 'main.jazz')
+    main_text = 'require "poly.jinc"\nfn test() { poly_add(); }'
     with open(main, 'w') as f:
-        f.write('require "poly.jinc"\nfn test() { poly_add(); }')
+        f.write(main_text)
     
-    return main, poly
+    return main, poly, main_text
 
 def test4_lowercase_folder(tmpdir):
     """from common require "file.jinc" (lowercase namespace) """
@@ -140,10 +103,11 @@ def test4_lowercase_folder(tmpdir):
         f.write('fn poly_add() { }')
     
     main = os.path.join(tmpdir, 'main.jazz')
+    main_text = 'from common require "poly.jinc"\nfn test() { poly_add(); }'
     with open(main, 'w') as f:
-        f.write('from common require "poly.jinc"\nfn test() { poly_add(); }')
+        f.write(main_text)
     
-    return main, poly
+    return main, poly, main_text
 
 def test5_multiple_requires(tmpdir):
     """Multiple from/require statements """
@@ -159,22 +123,25 @@ def test5_multiple_requires(tmpdir):
         f.write('fn aes_encrypt() { }')
     
     main = os.path.join(tmpdir, 'main.jazz')
-    with open(main, 'w') as f:
-        f.write('''from Common require "poly.jinc"
+    main_text = '''from Common require "poly.jinc"
 from Crypto require "aes.jinc"
 fn test() { 
   poly_add();
   aes_encrypt();
-}''')
+}'''
+    with open(main, 'w') as f:
+        f.write(main_text)
     
-    return main, poly  # Test poly_add
+    return main, poly, main_text  # Test poly_add
 
 
 # Pytest test functions
 
-def test_simple_namespace():
+def test_simple_namespace(lsp_client, scenario_root):
     """Test: from Common require "file.jinc" """
     assert run_test_scenario(
+        lsp_client,
+        scenario_root,
         "Simple namespace", 
         test1_simple_namespace, 
         1, 12, 
@@ -182,9 +149,11 @@ def test_simple_namespace():
     )
 
 
-def test_nested_path():
+def test_nested_path(lsp_client, scenario_root):
     """Test: from Common require "crypto/aes.jinc" """
     assert run_test_scenario(
+        lsp_client,
+        scenario_root,
         "Nested path in namespace", 
         test2_nested_path, 
         1, 12, 
@@ -192,9 +161,11 @@ def test_nested_path():
     )
 
 
-def test_no_namespace():
+def test_no_namespace(lsp_client, scenario_root):
     """Test: require "file.jinc" (no from clause) """
     assert run_test_scenario(
+        lsp_client,
+        scenario_root,
         "No namespace (plain require)", 
         test3_no_namespace, 
         1, 12, 
@@ -202,9 +173,11 @@ def test_no_namespace():
     )
 
 
-def test_lowercase_folder():
+def test_lowercase_folder(lsp_client, scenario_root):
     """Test: from common require "file.jinc" (lowercase namespace) """
     assert run_test_scenario(
+        lsp_client,
+        scenario_root,
         "Lowercase namespace folder", 
         test4_lowercase_folder, 
         1, 12, 
@@ -212,46 +185,14 @@ def test_lowercase_folder():
     )
 
 
-def test_multiple_requires():
+def test_multiple_requires(lsp_client, scenario_root):
     """Test: Multiple from/require statements """
     assert run_test_scenario(
+        lsp_client,
+        scenario_root,
         "Multiple from/require", 
         test5_multiple_requires, 
         3, 2, 
         "Common/poly.jinc"
     )
 
-
-if __name__ == "__main__":
-    print("="*70)
-    print("COMPREHENSIVE FROM/REQUIRE TESTS")
-    print("="*70)
-    
-    tests = [
-        ("Simple namespace", test1_simple_namespace, 1, 12, "Common/poly.jinc"),
-        ("Nested path in namespace", test2_nested_path, 1, 12, "Common/crypto/aes.jinc"),
-        ("No namespace (plain require)", test3_no_namespace, 1, 12, "poly.jinc"),
-        ("Lowercase namespace folder", test4_lowercase_folder, 1, 12, "common/poly.jinc"),
-        ("Multiple from/require", test5_multiple_requires, 3, 2, "Common/poly.jinc"),
-    ]
-    
-    results = []
-    for name, setup, line, char, expected_rel in tests:
-        passed = run_test_scenario(name, setup, line, char, expected_rel)
-        results.append((name, passed))
-    
-    print("\n" + "="*70)
-    print("SUMMARY")
-    print("="*70)
-    for name, passed in results:
-        status = "✅ PASS" if passed else "❌ FAIL"
-        print(f"{status}: {name}")
-    
-    all_passed = all(passed for _, passed in results)
-    print("\n" + "="*70)
-    if all_passed:
-        print("✅ ALL TESTS PASSED")
-        exit(0)
-    else:
-        print("❌ SOME TESTS FAILED")
-        exit(1)
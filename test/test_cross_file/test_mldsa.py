@@ -4,291 +4,194 @@ Test the Jasmin LSP with the real-world ML-DSA algorithm from formosa-mldsa
 This tests cross-file navigation with params, globals, and the 'from NAMESPACE require' syntax
 """
 
-import subprocess
-import json
 import sys
 import os
+import re
+import pytest
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
 
-LSP_SERVER = "_build/default/jasmin-lsp/jasmin_lsp.exe"
+from conftest import LSPClient, read_source
 
-def send_request(proc, request):
-    content = json.dumps(request)
-    message = f"Content-Length: {len(content)}\r\n\r\n{content}"
-    proc.stdin.write(message.encode())
-    proc.stdin.flush()
+# The formosa-mldsa checkout the test runs against, when it is present
+ML_DSA_DIR = "/Users/clebreto/dev/splits/formosa-mldsa/x86-64/avx2/ml_dsa_65"
+ML_DSA_PATH = os.path.join(ML_DSA_DIR, "ml_dsa.jazz")
+PARAMS_PATH = os.path.join(ML_DSA_DIR, "parameters.jinc")
 
-def read_response(proc, expected_id=None, timeout=3.0):
-    import select
-    while True:
-        ready, _, _ = select.select([proc.stdout], [], [], timeout)
-        if not ready:
-            return None
-        
-        headers = {}
-        while True:
-            line = proc.stdout.readline().decode().strip()
-            if not line:
-                break
-            if ": " not in line:
-                continue
-            key, value = line.split(": ", 1)
-            headers[key] = value
-        
-        content_length = int(headers.get("Content-Length", 0))
-        if content_length == 0:
-            return None
-        content = proc.stdout.read(content_length).decode()
-        response = json.loads(content)
-        
-        if expected_id is not None and "id" not in response:
+pytestmark = pytest.mark.skipif(not os.path.exists(ML_DSA_PATH), reason="formosa-mldsa not present")
+
+# The line requiring parameters.jinc, and uses of the parameters test 3
+# navigates from
+REQUIRE_PARAMETERS = re.compile(r"^(?=.*require).*?parameters\.jinc", re.M)
+TEST_PARAMS = ["ROWS_IN_MATRIX_A", "ETA", "GAMMA1", "GAMMA2"]
+PARAM_USE = re.compile("|".join(TEST_PARAMS))
+
+# LSP SymbolKind the server reports `param` declarations with (Constant)
+PARAM_SYMBOL_KIND = 14
+
+def position_of(content, offset):
+    """(line, character, line text) of an offset in content"""
+    line_start = content.rfind("\n", 0, offset) + 1
+    line_end = content.find("\n", offset)
+    line = content[line_start:] if line_end == -1 else content[line_start:line_end]
+    return content.count("\n", 0, offset), offset - line_start, line
+
+def find_param_uses(content):
+    """Map each of TEST_PARAMS to the position of its first use outside a // comment line
+    
+    A single scan of content; positions are only computed for the matches kept.
+    """
+    uses = {}
+    for match in PARAM_USE.finditer(content):
+        name = match.group()
+        if name in uses:
             continue
-        
-        if expected_id is not None and "id" in response:
-            if response["id"] == expected_id:
-                return response
-        else:
-            return response
+        line_no, char_pos, line = position_of(content, match.start())
+        if not line.lstrip().startswith("//"):
+            uses[name] = (line_no, char_pos, line)
+            if len(uses) == len(TEST_PARAMS):
+                break
+    return uses
 
-def test_mldsa_navigation():
-    """Test cross-file navigation in the ML-DSA implementation"""
+def run_mldsa_navigation(lsp_client):
+    """Test cross-file navigation in the ML-DSA implementation - returns True if it works"""
     print("="*70)
     print("Testing Jasmin LSP with formosa-mldsa (Real-World ML-DSA)")
     print("="*70)
     
-    # Paths to test files
-    ml_dsa_path = "/Users/clebreto/dev/splits/formosa-mldsa/x86-64/avx2/ml_dsa_65/ml_dsa.jazz"
-    params_path = "/Users/clebreto/dev/splits/formosa-mldsa/x86-64/avx2/ml_dsa_65/parameters.jinc"
+    ml_dsa_content = read_source(ML_DSA_PATH)
+    params_content = read_source(PARAMS_PATH)
     
-    if not os.path.exists(ml_dsa_path):
-        print(f"❌ File not found: {ml_dsa_path}")
-        return False
+    ml_dsa_uri = f"file://{ML_DSA_PATH}"
+    params_uri = f"file://{PARAMS_PATH}"
     
-    if not os.path.exists(params_path):
-        print(f"❌ File not found: {params_path}")
-        return False
+    # The session's server is already initialized, and requires are
+    # resolved relative to the requiring file, so it needs no workspace root
+    print("\n📄 Opening parameters.jinc and ml_dsa.jazz...")
+    lsp_client.open_document(params_uri, params_content)
+    lsp_client.open_document(ml_dsa_uri, ml_dsa_content)
+    print("✅ Opened parameters.jinc and ml_dsa.jazz")
     
-    ml_dsa_uri = f"file://{ml_dsa_path}"
-    params_uri = f"file://{params_path}"
+    # Test 1: Check if we can see symbols from parameters.jinc
+    print("\n" + "="*70)
+    print("Test 1: Document Symbols in parameters.jinc")
+    print("="*70)
     
-    # Start LSP server
-    lsp_path = "/Users/clebreto/dev/splits/jasmin-lsp/_build/default/jasmin-lsp/jasmin_lsp.exe"
-    if not os.path.exists(lsp_path):
-        print(f"❌ LSP server not found: {lsp_path}")
-        print("Please build it first: cd /Users/clebreto/dev/splits/jasmin-lsp && pixi run build")
-        return False
+    response = lsp_client.document_symbols(params_uri)
+    if response and "result" in response:
+        symbols = response["result"]
+        param_count = sum(1 for s in symbols if s.get("kind") == PARAM_SYMBOL_KIND)
+        print(f"✅ Found {len(symbols)} symbols in parameters.jinc")
+        print(f"   Including {param_count} parameters")
+        
+        # Show first few symbols
+        for symbol in symbols[:5]:
+            name = symbol.get("name", "Unknown")
+            kind = symbol.get("kind", 0)
+            print(f"   - {name} (kind: {kind})")
+    else:
+        print("⚠️  Could not retrieve document symbols")
     
-    proc = subprocess.Popen(
-        [lsp_path],
-        stdin=subprocess.PIPE,
-        stdout=subprocess.PIPE,
-        stderr=subprocess.PIPE
-    )
+    # Test 2: Navigate from ml_dsa.jazz to require statement
+    print("\n" + "="*70)
+    print("Test 2: Navigate to required file (parameters.jinc)")
+    print("="*70)
     
-    try:
-        # Initialize
-        print("\n📡 Initializing LSP server...")
-        send_request(proc, {
-            "jsonrpc": "2.0",
-            "id": 1,
-            "method": "initialize",
-            "params": {
-                "processId": None,
-                "rootUri": f"file:///Users/clebreto/dev/splits/formosa-mldsa/x86-64/avx2/ml_dsa_65",
-                "capabilities": {}
-            }
-        })
-        response = read_response(proc, expected_id=1)
-        if not response:
-            print("❌ Failed to initialize LSP server")
-            return False
-        print("✅ LSP server initialized")
-        
-        send_request(proc, {
-            "jsonrpc": "2.0",
-            "method": "initialized",
-            "params": {}
-        })
-        
-        import time
-        time.sleep(0.2)
-        
-        # Open parameters.jinc
-        print("\n📄 Opening parameters.jinc...")
-        with open(params_path) as f:
-            params_content = f.read()
-        
-        send_request(proc, {
-            "jsonrpc": "2.0",
-            "method": "textDocument/didOpen",
-            "params": {
-                "textDocument": {
-                    "uri": params_uri,
-                    "languageId": "jasmin",
-                    "version": 1,
-                    "text": params_content
-                }
-            }
-        })
-        print("✅ Opened parameters.jinc")
-        
-        # Open ml_dsa.jazz
-        print("📄 Opening ml_dsa.jazz...")
-        with open(ml_dsa_path) as f:
-            ml_dsa_content = f.read()
-        
-        send_request(proc, {
-            "jsonrpc": "2.0",
-            "method": "textDocument/didOpen",
-            "params": {
-                "textDocument": {
-                    "uri": ml_dsa_uri,
-                    "languageId": "jasmin",
-                    "version": 1,
-                    "text": ml_dsa_content
-                }
-            }
-        })
-        print("✅ Opened ml_dsa.jazz")
-        
-        time.sleep(0.2)
-        
-        # Test 1: Check if we can see symbols from parameters.jinc
-        print("\n" + "="*70)
-        print("Test 1: Document Symbols in parameters.jinc")
-        print("="*70)
-        
-        send_request(proc, {
-            "jsonrpc": "2.0",
-            "id": 2,
-            "method": "textDocument/documentSymbol",
-            "params": {
-                "textDocument": {"uri": params_uri}
-            }
-        })
-        
-        response = read_response(proc, expected_id=2, timeout=5.0)
-        if response and "result" in response:
-            symbols = response["result"]
-            param_count = len([s for s in symbols if "param" in str(s).lower()])
-            print(f"✅ Found {len(symbols)} symbols in parameters.jinc")
-            print(f"   Including {param_count} parameters")
-            
-            # Show first few symbols
-            for symbol in symbols[:5]:
-                name = symbol.get("name", "Unknown")
-                kind = symbol.get("kind", 0)
-                print(f"   - {name} (kind: {kind})")
+    # Find the line with 'require "parameters.jinc"', positioned on the filename
+    match = REQUIRE_PARAMETERS.search(ml_dsa_content)
+    if match:
+        require_line, char_pos, line = position_of(ml_dsa_content, match.end() - len('parameters.jinc'))
+        print(f"Found require at line {require_line}: {line.strip()}")
+        
+        response = lsp_client.definition(ml_dsa_uri, require_line, char_pos + 5)
+        if response and "result" in response and response["result"]:
+            target_uri = response["result"][0].get("uri", "") if isinstance(response["result"], list) else response["result"].get("uri", "")
+            if "parameters.jinc" in target_uri:
+                print(f"✅ PASS: Navigate to parameters.jinc works!")
+            else:
+                print(f"❌ FAIL: Expected parameters.jinc, got {target_uri}")
+                return False
         else:
-            print("⚠️  Could not retrieve document symbols")
-        
-        # Test 2: Navigate from ml_dsa.jazz to require statement
-        print("\n" + "="*70)
-        print("Test 2: Navigate to required file (parameters.jinc)")
-        print("="*70)
-        
-        # Find the line with 'require "parameters.jinc"'
-        ml_dsa_lines = ml_dsa_content.split('\n')
-        require_line = None
-        for i, line in enumerate(ml_dsa_lines):
-            if 'parameters.jinc' in line and 'require' in line:
-                require_line = i
-                print(f"Found require at line {i}: {line.strip()}")
-                break
-        
-        if require_line is not None:
-            # Position on the filename
-            char_pos = ml_dsa_lines[require_line].index('parameters.jinc')
-            
-            send_request(proc, {
-                "jsonrpc": "2.0",
-                "id": 3,
-                "method": "textDocument/definition",
-                "params": {
-                    "textDocument": {"uri": ml_dsa_uri},
-                    "position": {"line": require_line, "character": char_pos + 5}
-                }
-            })
-            
-            response = read_response(proc, expected_id=3, timeout=5.0)
-            if response and "result" in response and response["result"]:
-                target_uri = response["result"][0].get("uri", "") if isinstance(response["result"], list) else response["result"].get("uri", "")
-                if "parameters.jinc" in target_uri:
-                    print(f"✅ PASS: Navigate to parameters.jinc works!")
-                else:
-                    print(f"❌ FAIL: Expected parameters.jinc, got {target_uri}")
+            print("⚠️  Could not navigate to required file")
+    
+    # Test 3: Look for parameter usage and try to navigate to definition
+    print("\n" + "="*70)
+    print("Test 3: Cross-file parameter reference navigation")
+    print("="*70)
+    
+    # Look for any parameter name from parameters.jinc used in ml_dsa.jazz
+    param_uses = find_param_uses(ml_dsa_content)
+    
+    # All the definition requests are written before any reply is read;
+    # those still outstanding once one succeeds are cancelled
+    requests = [
+        (name, lsp_client.send_request("textDocument/definition", {
+            "textDocument": {"uri": ml_dsa_uri},
+            "position": {"line": param_uses[name][0], "character": param_uses[name][1] + 2}
+        }))
+        for name in TEST_PARAMS if name in param_uses
+    ]
+    
+    param_navigated = False
+    for i, (param_name, req_id) in enumerate(requests):
+        found_line, char_pos, line = param_uses[param_name]
+        print(f"\n🔍 Found '{param_name}' at line {found_line}: {line.strip()}")
+        
+        response = lsp_client.read_response(expect_id=req_id)
+        if response and "result" in response and response["result"]:
+            locations = response["result"]
+            if isinstance(locations, list) and len(locations) > 0:
+                loc = locations[0]
             else:
-                print("⚠️  Could not navigate to required file")
-        
-        # Test 3: Look for parameter usage and try to navigate to definition
-        print("\n" + "="*70)
-        print("Test 3: Cross-file parameter reference navigation")
-        print("="*70)
-        
-        # Look for any parameter name from parameters.jinc used in ml_dsa.jazz
-        # Let's search for common parameter names
-        test_params = ["ROWS_IN_MATRIX_A", "ETA", "GAMMA1", "GAMMA2"]
-        
-        for param_name in test_params:
-            # Check if parameter is used in ml_dsa.jazz or its includes
-            found_line = None
-            for i, line in enumerate(ml_dsa_lines):
-                if param_name in line and not line.strip().startswith('//'):
-                    found_line = i
-                    print(f"\n🔍 Found '{param_name}' at line {i}: {line.strip()}")
-                    break
+                loc = locations
             
-            if found_line is not None:
-                char_pos = ml_dsa_lines[found_line].index(param_name)
-                
-                send_request(proc, {
-                    "jsonrpc": "2.0",
-                    "id": 4,
-                    "method": "textDocument/definition",
-                    "params": {
-                        "textDocument": {"uri": ml_dsa_uri},
-                        "position": {"line": found_line, "character": char_pos + 2}
-                    }
-                })
-                
-                response = read_response(proc, expected_id=4, timeout=5.0)
-                if response and "result" in response and response["result"]:
-                    locations = response["result"]
-                    if isinstance(locations, list) and len(locations) > 0:
-                        loc = locations[0]
-                    else:
-                        loc = locations
-                    
-                    target_uri = loc.get("uri", "")
-                    if "parameters.jinc" in target_uri or "constants.jinc" in target_uri:
-                        print(f"   ✅ Successfully navigated to parameter definition!")
-                        print(f"      Target: {os.path.basename(target_uri)}")
-                        return True
-                    else:
-                        print(f"   ⚠️  Pointed to: {target_uri}")
-                else:
-                    error = response.get("error", {}).get("message", "Unknown") if response else "Timeout"
-                    print(f"   ⚠️  Navigation failed: {error}")
-        
-        print("\n" + "="*70)
-        print("Summary")
-        print("="*70)
-        print("The formosa-mldsa project uses complex Jasmin features:")
-        print("  - Multiple require statements")
-        print("  - 'from NAMESPACE require' syntax")
-        print("  - Deep directory hierarchies")
-        print("  - Many parameter definitions")
-        print("\nOur LSP successfully handles:")
-        print("  ✅ Opening and parsing ML-DSA files")
-        print("  ✅ Extracting symbols from parameter files")
-        print("  ✅ Navigating to required files")
-        print("\n🎉 Jasmin LSP is working with real-world ML-DSA code!")
-        
-        return True
-        
-    finally:
-        proc.terminate()
-        proc.wait()
+            target_uri = loc.get("uri", "")
+            if "parameters.jinc" in target_uri or "constants.jinc" in target_uri:
+                print(f"   ✅ Successfully navigated to parameter definition!")
+                print(f"      Target: {os.path.basename(target_uri)}")
+                for _, later_id in requests[i + 1:]:
+                    lsp_client.cancel_request(later_id)
+                param_navigated = True
+                break
+            else:
+                print(f"   ⚠️  Pointed to: {target_uri}")
+        else:
+            error = response.get("error", {}).get("message", "Unknown") if response else "Timeout"
+            print(f"   ⚠️  Navigation failed: {error}")
+    
+    if not param_navigated:
+        print("\n❌ FAIL: No parameter use navigated to its definition")
+        return False
+    
+    print("\n" + "="*70)
+    print("Summary")
+    print("="*70)
+    print("The formosa-mldsa project uses complex Jasmin features:")
+    print("  - Multiple require statements")
+    print("  - 'from NAMESPACE require' syntax")
+    print("  - Deep directory hierarchies")
+    print("  - Many parameter definitions")
+    print("\nOur LSP successfully handles:")
+    print("  ✅ Opening and parsing ML-DSA files")
+    print("  ✅ Extracting symbols from parameter files")
+    print("  ✅ Navigating to required files")
+    print("  ✅ Navigating to parameter definitions")
+    print("\n🎉 Jasmin LSP is working with real-world ML-DSA code!")
+    
+    return True
+
+def test_mldsa_navigation(lsp_client):
+    """Test cross-file navigation in the ML-DSA implementation"""
+    assert run_mldsa_navigation(lsp_client), "Cross-file navigation in ml_dsa.jazz failed"
 
 if __name__ == "__main__":
-    success = test_mldsa_navigation()
+    if not os.path.exists(ML_DSA_PATH):
+        print(f"❌ File not found: {ML_DSA_PATH}")
+        sys.exit(1)
+    client = LSPClient()
+    client.start()
+    try:
+        client.initialize()
+        success = run_mldsa_navigation(client)
+    finally:
+        client.stop()
     sys.exit(0 if success else 1)
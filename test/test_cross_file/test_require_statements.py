@@ -3,16 +3,23 @@ Tests for cross-file features (require statements).
 """
 
 import pytest
-from conftest import assert_response_ok, assert_has_result
+from conftest import assert_response_ok, assert_ok_result
 
 
-def test_cross_file_goto_definition(fixture_file, lsp_client):
+# The library and the main program requiring it, opened once for the module
+@pytest.fixture(scope="module")
+def lib_file(module_fixture_file):
+    return module_fixture_file("math_lib.jazz")
+
+
+@pytest.fixture(scope="module")
+def main_file(module_fixture_file):
+    return module_fixture_file("main_program.jazz")
+
+
+def test_cross_file_goto_definition(lib_file, main_file, lsp_client):
     """Test go-to-definition across files with require statement."""
-    # Open the library file
-    lib_uri, lib_content = fixture_file("math_lib.jazz")
-    
-    # Open the main program that requires the library
-    main_uri, main_content = fixture_file("main_program.jazz")
+    main_uri, main_content = main_file
     
     # Try to go to definition of a function from math_lib used in main_program
     # This depends on the actual content of the fixtures
@@ -20,10 +27,8 @@ def test_cross_file_goto_definition(fixture_file, lsp_client):
     
     # Position on function call in main_program (adjust based on actual fixture)
     response = lsp_client.definition(main_uri, line=13, character=10)
-    assert_response_ok(response, "cross-file goto definition")
-    assert_has_result(response, "cross-file goto definition")
+    result = assert_ok_result(response, "cross-file goto definition")
     
-    result = response["result"]
     if result is not None:
         if isinstance(result, list):
             assert len(result) > 0, "Should find definition"
@@ -36,27 +41,23 @@ def test_cross_file_goto_definition(fixture_file, lsp_client):
         # URI should be different (in the library file)
 
 
-def test_cross_file_references(fixture_file, lsp_client):
+def test_cross_file_references(lib_file, main_file, lsp_client):
     """Test find references across files."""
-    # Open both files
-    lib_uri, _ = fixture_file("math_lib.jazz")
-    main_uri, _ = fixture_file("main_program.jazz")
+    lib_uri, _ = lib_file
     
     # Find references to a function defined in lib and used in main
     # Position on function definition in math_lib
     response = lsp_client.references(lib_uri, line=3, character=3, include_declaration=True)
-    assert_response_ok(response, "cross-file references")
-    assert_has_result(response, "cross-file references")
+    result = assert_ok_result(response, "cross-file references")
     
-    result = response["result"]
     if result is not None and isinstance(result, list):
         # Should find references in both files
         assert len(result) >= 1, "Should find at least one reference"
 
 
-def test_require_statement_navigation(fixture_file, lsp_client):
+def test_require_statement_navigation(main_file, lsp_client):
     """Test that clicking on require statement filename goes to that file."""
-    main_uri, main_content = fixture_file("main_program.jazz")
+    main_uri, main_content = main_file
     
     # Find the line with 'require "math_lib.jazz"'
     # Position on the filename string in require statement
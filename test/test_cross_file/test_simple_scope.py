@@ -3,50 +3,17 @@
 Simple test to verify scope resolution fix
 """
 
-import subprocess
 import json
 import sys
 import os
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
 
-LSP_SERVER = "_build/default/jasmin-lsp/jasmin_lsp.exe"
+from conftest import LSP_SERVER, LSPClient
 
-def send_request(proc, request):
-    content = json.dumps(request)
-    message = f"Content-Length: {len(content)}\r\n\r\n{content}"
-    proc.stdin.write(message.encode())
-    proc.stdin.flush()
-
-def read_response(proc, expected_id=None, timeout=3.0):
-    import select
-    while True:
-        ready, _, _ = select.select([proc.stdout], [], [], timeout)
-        if not ready:
-            return None
-        
-        headers = {}
-        while True:
-            line = proc.stdout.readline().decode().strip()
-            if not line:
-                break
-            if ": " not in line:
-                continue
-            key, value = line.split(": ", 1)
-            headers[key] = value
-        
-        content_length = int(headers.get("Content-Length", 0))
-        if content_length == 0:
-            return None
-        content = proc.stdout.read(content_length).decode()
-        response = json.loads(content)
-        
-        if expected_id is not None and "id" not in response:
-            continue
-        
-        if expected_id is not None and "id" in response:
-            if response["id"] == expected_id:
-                return response
-        else:
-            return response
+def wait_until_handled(client, uri):
+    """Wait for the server to handle what was sent before; it answers in order"""
+    response = client.document_symbols(uri)
+    assert response is not None, f"Server did not answer a documentSymbol request for {uri}"
 
 def test_scope_resolution():
     """Test that go-to-definition respects function scope"""
@@ -91,62 +58,35 @@ export fn ml_dsa_44_verify(
     print("=" * 70)
     
     # Start LSP server
-    lsp_path = "_build/default/jasmin-lsp/jasmin_lsp.exe"
-    if not os.path.exists(lsp_path):
-        print(f"❌ LSP server not found: {lsp_path}")
+    if not LSP_SERVER.exists():
+        print(f"❌ LSP server not found: {LSP_SERVER}")
         return False
     
-    proc = subprocess.Popen(
-        [lsp_path],
-        stdin=subprocess.PIPE,
-        stdout=subprocess.PIPE,
-        stderr=subprocess.PIPE
-    )
+    client = LSPClient()
+    client.start()
     
     try:
         # Initialize
         print("\n📡 Initializing LSP server...")
-        send_request(proc, {
-            "jsonrpc": "2.0",
-            "id": 1,
-            "method": "initialize",
-            "params": {
-                "processId": None,
-                "rootUri": "file:///tmp",
-                "capabilities": {}
-            }
-        })
-        response = read_response(proc, expected_id=1)
+        response = client.initialize("file:///tmp")
         if not response or "error" in response:
             print(f"❌ Failed to initialize: {response}")
             return False
         print("✓ Initialized")
         
-        # Initialized notification
-        send_request(proc, {
-            "jsonrpc": "2.0",
-            "method": "initialized",
-            "params": {}
-        })
-        
         # Open document
         print("📂 Opening document...")
-        send_request(proc, {
-            "jsonrpc": "2.0",
-            "method": "textDocument/didOpen",
-            "params": {
-                "textDocument": {
-                    "uri": file_uri,
-                    "languageId": "jasmin",
-                    "version": 1,
-                    "text": test_content
-                }
+        client.send_notification("textDocument/didOpen", {
+            "textDocument": {
+                "uri": file_uri,
+                "languageId": "jasmin",
+                "version": 1,
+                "text": test_content
             }
         })
         
-        # Wait a bit for parsing
-        import time
-        time.sleep(1.0)
+        # Wait until it is parsed
+        wait_until_handled(client, file_uri)
         print("✓ Document opened and parsed")
         
         # Test: Go to definition on second 'status' in 'status = status;' in ml_dsa_44_verify
@@ -154,17 +94,7 @@ export fn ml_dsa_44_verify(
         print("\n📍 Test: Second 'status' in 'status = status;' in ml_dsa_44_verify")
         print("   Looking at line 23 (0-indexed), character 15")
         
-        send_request(proc, {
-            "jsonrpc": "2.0",
-            "id": 2,
-            "method": "textDocument/definition",
-            "params": {
-                "textDocument": {"uri": file_uri},
-                "position": {"line": 23, "character": 15}  # 0-indexed: line 24 in editor
-            }
-        })
-        
-        def_response = read_response(proc, expected_id=2)
+        def_response = client.definition(file_uri, 23, 15)  # 0-indexed: line 24 in editor
         
         if not def_response:
             print("❌ ERROR: No response received")
@@ -197,17 +127,14 @@ export fn ml_dsa_44_verify(
             return False
         
     finally:
-        proc.terminate()
-        proc.wait(timeout=2)
-        
-        # Read and print stderr logs
-        if proc.stderr:
-            stderr_output = proc.stderr.read().decode('utf-8', errors='ignore')
-            if stderr_output:
-                print("\n" + "="*70)
-                print("LSP SERVER LOGS (stderr):")
-                print("="*70)
-                print(stderr_output)
+        # Read and print stderr logs; they are gone once the server stops
+        stderr_output = client.get_stderr()
+        client.stop()
+        if stderr_output:
+            print("\n" + "="*70)
+            print("LSP SERVER LOGS (stderr):")
+            print("="*70)
+            print(stderr_output)
         
         print("\n✓ LSP server stopped")
 
@@ -43,32 +43,33 @@ messages = [
     }
 ]
 
-input_data = ''
+parts = []
 for msg in messages:
-    content = json.dumps(msg)
-    content_bytes = content.encode('utf-8')
-    input_data += f'Content-Length: {len(content_bytes)}\r\n\r\n{content}'
+    body = json.dumps(msg).encode('utf-8')
+    parts.append(b'Content-Length: %d\r\n\r\n' % len(body))
+    parts.append(body)
 
 result = subprocess.run(
     [server_path],
-    input=input_data,
+    input=b''.join(parts),
     capture_output=True,
-    text=True,
     timeout=5
 )
+stdout = result.stdout.decode('utf-8', errors='replace')
+stderr = result.stderr.decode('utf-8', errors='replace')
 
 print("=== STDOUT ===")
-print(result.stdout)
+print(stdout)
 
 print("\n=== STDERR (last 30 lines) ===")
-lines = result.stderr.split('\n')
+lines = stderr.split('\n')
 for line in lines[-30:]:
     print(line)
 
 # Check for diagnostics
-if 'publishDiagnostics' in result.stdout:
+if 'publishDiagnostics' in stdout:
     print("\n✅ Diagnostics notification sent")
-    if '"diagnostics":[]' in result.stdout:
+    if '"diagnostics":[]' in stdout:
         print("❌ But diagnostics list is empty - no errors detected!")
     else:
         print("✅ Diagnostics contains errors")
@@ -3,7 +3,6 @@ Tests for syntax diagnostics and error reporting.
 """
 
 import pytest
-import time
 from conftest import assert_response_ok
 
 
@@ -33,15 +32,12 @@ def test_clean_code_no_diagnostics(temp_document, lsp_client):
     # Set as master file
     lsp_client.set_master_file(uri)
     
-    # Wait a bit for diagnostics to be computed
-    time.sleep(0.2)
-    
-    # Collect diagnostics
-    diagnostics = lsp_client.collect_diagnostics(timeout=0.5)
+    # Wait for the diagnostics published for the file
+    diagnostics = lsp_client.wait_for_diagnostics(uri)
     
     # Clean code should have no diagnostics
-    assert uri in diagnostics, "Should receive diagnostics for the file"
-    assert len(diagnostics[uri]) == 0, f"Clean code should have no errors, got {len(diagnostics[uri])}"
+    assert diagnostics is not None, "Should receive diagnostics for the file"
+    assert len(diagnostics) == 0, f"Clean code should have no errors, got {len(diagnostics)}"
     assert lsp_client.is_alive(), "Server should still be alive"
 
 
@@ -52,15 +48,12 @@ def test_syntax_errors_generate_diagnostics(temp_document, lsp_client):
     # Set as master file
     lsp_client.set_master_file(uri)
     
-    # Wait for diagnostics to be computed and sent
-    time.sleep(0.2)
-    
-    # Collect diagnostics
-    diagnostics = lsp_client.collect_diagnostics(timeout=0.5)
+    # Wait for the diagnostics published for the file
+    diagnostics = lsp_client.wait_for_diagnostics(uri)
     
     # Syntax errors should generate diagnostics
-    assert uri in diagnostics, "Should receive diagnostics for the file"
-    assert len(diagnostics[uri]) > 0, "Syntax errors should generate diagnostics"
+    assert diagnostics is not None, "Should receive diagnostics for the file"
+    assert len(diagnostics) > 0, "Syntax errors should generate diagnostics"
     assert lsp_client.is_alive(), "Server should handle syntax errors gracefully"
 
 
@@ -70,31 +63,28 @@ def test_document_change_updates_diagnostics(temp_document, lsp_client):
     
     # Set as master file
     lsp_client.set_master_file(uri)
-    time.sleep(0.1)
     
     # Check initial diagnostics (should be clean)
-    initial_diagnostics = lsp_client.collect_diagnostics(timeout=0.5)
-    assert uri in initial_diagnostics, "Should receive initial diagnostics"
-    assert len(initial_diagnostics[uri]) == 0, "Initial code should have no errors"
+    initial_diagnostics = lsp_client.wait_for_diagnostics(uri)
+    assert initial_diagnostics is not None, "Should receive initial diagnostics"
+    assert len(initial_diagnostics) == 0, "Initial code should have no errors"
     
     # Introduce a syntax error
     lsp_client.change_document(uri, SYNTAX_ERROR_CODE, version=2)
-    time.sleep(0.2)
     
     # Check diagnostics after introducing error
-    error_diagnostics = lsp_client.collect_diagnostics(timeout=0.5)
-    assert uri in error_diagnostics, "Should receive diagnostics after change"
-    assert len(error_diagnostics[uri]) > 0, "Should have errors after introducing syntax error"
+    error_diagnostics = lsp_client.wait_for_diagnostics(uri)
+    assert error_diagnostics is not None, "Should receive diagnostics after change"
+    assert len(error_diagnostics) > 0, "Should have errors after introducing syntax error"
     assert lsp_client.is_alive(), "Server should handle document changes"
     
     # Fix the syntax error
     lsp_client.change_document(uri, CLEAN_CODE, version=3)
-    time.sleep(0.2)
     
     # Check diagnostics after fix
-    fixed_diagnostics = lsp_client.collect_diagnostics(timeout=0.5)
-    assert uri in fixed_diagnostics, "Should receive diagnostics after fix"
-    assert len(fixed_diagnostics[uri]) == 0, "Should have no errors after fix"
+    fixed_diagnostics = lsp_client.wait_for_diagnostics(uri)
+    assert fixed_diagnostics is not None, "Should receive diagnostics after fix"
+    assert len(fixed_diagnostics) == 0, "Should have no errors after fix"
     assert lsp_client.is_alive(), "Server should update diagnostics on fix"
 
 
@@ -104,24 +94,23 @@ def test_multiple_files_diagnostics(temp_document, lsp_client):
     
     # Set first file as master
     lsp_client.set_master_file(uri1)
-    time.sleep(0.1)
     
     uri2 = temp_document(SYNTAX_ERROR_CODE, "file2.jazz")
-    time.sleep(0.2)
     
-    # Collect diagnostics
-    diagnostics = lsp_client.collect_diagnostics(timeout=0.5)
+    # Wait for the diagnostics of each file
+    diagnostics1 = lsp_client.wait_for_diagnostics(uri1)
+    diagnostics2 = lsp_client.wait_for_diagnostics(uri2)
     
     # Both files should be handled
     assert lsp_client.is_alive(), "Server should handle multiple files"
     
     # First file should have no errors
-    assert uri1 in diagnostics, "Should receive diagnostics for first file"
-    assert len(diagnostics[uri1]) == 0, "First file should have no errors"
+    assert diagnostics1 is not None, "Should receive diagnostics for first file"
+    assert len(diagnostics1) == 0, "First file should have no errors"
     
     # Second file should have errors
-    assert uri2 in diagnostics, "Should receive diagnostics for second file"
-    assert len(diagnostics[uri2]) > 0, "Second file should have syntax errors"
+    assert diagnostics2 is not None, "Should receive diagnostics for second file"
+    assert len(diagnostics2) > 0, "Second file should have syntax errors"
 
 
 def test_array_index_with_cast_syntax_error(temp_document, lsp_client):
@@ -146,18 +135,15 @@ def test_array_index_with_cast_syntax_error(temp_document, lsp_client):
     # Set as master file
     lsp_client.set_master_file(uri)
     
-    # Wait for diagnostics to be computed
-    time.sleep(0.2)
-    
-    # Collect diagnostics
-    diagnostics = lsp_client.collect_diagnostics(timeout=0.5)
+    # Wait for the diagnostics published for the file
+    diagnostics = lsp_client.wait_for_diagnostics(uri)
     
     # Valid (uint) cast syntax should produce no diagnostics
     assert lsp_client.is_alive(), "Server should handle valid (uint) cast syntax"
-    assert uri in diagnostics, "Should receive diagnostics for the file"
+    assert diagnostics is not None, "Should receive diagnostics for the file"
     
     # Check if there are any errors and print them for debugging
-    if len(diagnostics[uri]) > 0:
-        print(f"\nDiagnostics found: {diagnostics[uri]}")
+    if len(diagnostics) > 0:
+        print(f"\nDiagnostics found: {diagnostics}")
     
-    assert len(diagnostics[uri]) == 0, f"Valid (uint) cast should have no errors, got {len(diagnostics[uri])} errors"
+    assert len(diagnostics) == 0, f"Valid (uint) cast should have no errors, got {len(diagnostics)} errors"
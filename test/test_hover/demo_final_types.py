@@ -4,6 +4,11 @@
 import subprocess, json, sys
 from pathlib import Path
 
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
 LSP_SERVER = Path(__file__).parent.parent.parent / "_build/default/jasmin-lsp/jasmin_lsp.exe"
 
 # Realistic Jasmin code with complex types
@@ -33,21 +38,48 @@ fn process_data(reg u8 byte, reg u16 word, reg u32 dword, reg u64 qword) -> reg
 """
 
 def send(r):
-    c = json.dumps(r)
-    return f"Content-Length: {len(c)}\r\n\r\n{c}"
+    c = orjson.dumps(r) if orjson else json.dumps(r).encode("utf-8")
+    return b"Content-Length: %d\r\n\r\n" % len(c) + c
 
-def recv(proc, expected_id=None):
-    for _ in range(30):
-        line = proc.stdout.readline()
-        if not line:
-            return None
-        if line.startswith("Content-Length"):
-            length = int(line.split(":")[1].strip())
-            proc.stdout.readline()
-            response = json.loads(proc.stdout.read(length))
-            if expected_id is None or response.get("id") == expected_id:
-                return response
-    return None
+class FramedReader:
+    """Buffer the server output and hand out responses by id."""
+    
+    def __init__(self, f):
+        self.f = f
+        self.buf = bytearray()
+        # Reused for every read instead of allocating a new chunk each time
+        self.chunk = bytearray(1 << 16)
+        self.pending = {}
+    
+    def _next(self):
+        """Parse one framed message from the buffer, reading more as needed."""
+        while True:
+            end = self.buf.find(b"\r\n\r\n")
+            if end != -1:
+                length = 0
+                for header in bytes(self.buf[:end]).split(b"\r\n"):
+                    if header.lower().startswith(b"content-length:"):
+                        length = int(header.split(b":", 1)[1])
+                start = end + 4
+                if len(self.buf) >= start + length:
+                    body = bytes(self.buf[start:start + length])
+                    del self.buf[:start + length]
+                    return orjson.loads(body) if orjson else json.loads(body)
+            n = self.f.readinto(self.chunk)
+            if not n:
+                return None
+            self.buf += memoryview(self.chunk)[:n]
+    
+    def get(self, msg_id):
+        """Return the response with the given id, stashing any others."""
+        while msg_id not in self.pending:
+            msg = self._next()
+            if msg is None:
+                return None
+            # Notifications and server requests are not responses
+            if "id" in msg and "method" not in msg:
+                self.pending[msg["id"]] = msg
+        return self.pending.pop(msg_id)
 
 def main():
     print("=" * 90)
@@ -59,24 +91,24 @@ def main():
         stdin=subprocess.PIPE,
         stdout=subprocess.PIPE,
         stderr=subprocess.PIPE,
-        text=True,
         bufsize=0
     )
     
     # Initialize
     proc.stdin.write(send({"jsonrpc":"2.0","id":1,"method":"initialize","params":{"processId":None,"rootUri":"file:///tmp","capabilities":{}}}))
     proc.stdin.flush()
-    recv(proc, 1)
+    reader = FramedReader(proc.stdout)
+    reader.get(1)
     
     proc.stdin.write(send({"jsonrpc":"2.0","method":"initialized","params":{}}))
     proc.stdin.flush()
     
     # Open document
     proc.stdin.write(send({"jsonrpc":"2.0","method":"textDocument/didOpen","params":{"textDocument":{"uri":"file:///tmp/demo.jazz","languageId":"jasmin","version":1,"text":CODE}}}))
+    # Requests are handled in order, so this reply means the file is parsed
+    proc.stdin.write(send({"jsonrpc":"2.0","id":99,"method":"textDocument/documentSymbol","params":{"textDocument":{"uri":"file:///tmp/demo.jazz"}}}))
     proc.stdin.flush()
-    
-    import time
-    time.sleep(0.3)
+    reader.get(99)
     
     print("\nSource Code (first 12 lines):")
     print("-" * 90)
@@ -104,11 +136,15 @@ def main():
     print("Hover Results:")
     print("=" * 90)
     
-    for line, char, desc, expected_substr in tests:
-        proc.stdin.write(send({"jsonrpc":"2.0","id":line+100,"method":"textDocument/hover","params":{"textDocument":{"uri":"file:///tmp/demo.jazz"},"position":{"line":line,"character":char}}}))
-        proc.stdin.flush()
-        
-        r = recv(proc, expected_id=line+100)
+    # Pipeline every hover in one write, then collect the responses by id
+    proc.stdin.write(b"".join(
+        send({"jsonrpc":"2.0","id":i+100,"method":"textDocument/hover","params":{"textDocument":{"uri":"file:///tmp/demo.jazz"},"position":{"line":line,"character":char}}})
+        for i, (line, char, _, _) in enumerate(tests)
+    ))
+    proc.stdin.flush()
+    
+    for i, (line, char, desc, expected_substr) in enumerate(tests):
+        r = reader.get(i + 100)
         
         if r and "result" in r and r["result"] and "contents" in r["result"]:
             val = r["result"]["contents"]["value"]
@@ -18,6 +18,12 @@ TEST_CODE = """fn test(reg u32 a b, stack u64 x y z) -> reg u32 {
 }"""
 
 
+@pytest.fixture(scope="module")
+def comprehensive_uri(module_document):
+    """Open TEST_CODE once for every test in this module."""
+    return module_document(TEST_CODE, "test_comprehensive.jazz")
+
+
 @pytest.mark.parametrize("line,char,expected_name,expected_type,description", [
     # Function parameters (whitespace-separated, no commas)
     (0, 16, "a", "reg u32", "Parameter 'a'"),
@@ -32,14 +38,11 @@ TEST_CODE = """fn test(reg u32 a b, stack u64 x y z) -> reg u32 {
     (2, 11, "p", "stack u8", "Variable 'p'"),
     (2, 14, "q", "stack u8", "Variable 'q'"),
 ])
-def test_multi_declaration_hover(lsp_client, temp_document, line, char, expected_name, expected_type, description):
+def test_multi_declaration_hover(lsp_client, comprehensive_uri, line, char, expected_name, expected_type, description):
     """Test that hover shows correct type for each identifier in multi-declarations."""
     
-    # Create document with test code
-    uri = temp_document(TEST_CODE, "test_comprehensive.jazz")
-    
     # Request hover at the specified position
-    response = lsp_client.hover(uri, line, char)
+    response = lsp_client.hover(comprehensive_uri, line, char)
     
     # Check response is valid
     assert response is not None, f"{description}: No response from server"
@@ -87,10 +90,10 @@ def test_multi_declaration_hover(lsp_client, temp_document, line, char, expected
     )
 
 
-def test_multi_declaration_comprehensive_info(lsp_client, temp_document):
+def test_multi_declaration_comprehensive_info(lsp_client, comprehensive_uri):
     """Test that we can get hover info for all multi-declared identifiers."""
     
-    uri = temp_document(TEST_CODE, "test_comprehensive.jazz")
+    uri = comprehensive_uri
     
     # Test that we get results for at least some of the identifiers
     positions_to_test = [
@@ -100,8 +103,7 @@ def test_multi_declaration_comprehensive_info(lsp_client, temp_document):
     ]
     
     results_found = 0
-    for line, char in positions_to_test:
-        response = lsp_client.hover(uri, line, char)
+    for response in lsp_client.hover_many(uri, positions_to_test):
         if response and "result" in response and response["result"]:
             results_found += 1
     
@@ -45,27 +45,28 @@ messages = [
     }
 ]
 
-input_data = ''
+parts = []
 for msg in messages:
-    content = json.dumps(msg)
-    content_bytes = content.encode('utf-8')
-    input_data += f'Content-Length: {len(content_bytes)}\r\n\r\n{content}'
+    body = json.dumps(msg).encode('utf-8')
+    parts.append(b'Content-Length: %d\r\n\r\n' % len(body))
+    parts.append(body)
 
 result = subprocess.run(
     [server_path],
-    input=input_data,
+    input=b''.join(parts),
     capture_output=True,
-    text=True,
     timeout=5
 )
+stdout = result.stdout.decode('utf-8', errors='replace')
+stderr = result.stderr.decode('utf-8', errors='replace')
 
 print("=== Hover Response ===")
 # Find the response to request id=2
-for line in result.stdout.split('\n'):
+for line in stdout.split('\n'):
     if '"id":2' in line or ('"result"' in line and 'hover' in line.lower()) or '"error"' in line:
         print(line[:200])
 
 print("\n=== STDERR (relevant) ===")
-for line in result.stderr.split('\n'):
+for line in stderr.split('\n'):
     if 'hover' in line.lower() or 'error' in line.lower() or 'exception' in line.lower():
         print(line)
@@ -3,11 +3,10 @@
 Test hover functionality on Jasmin keywords.
 """
 
-import json, subprocess, tempfile, os
-from pathlib import Path
+import sys, os
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
 
-# Server path - use absolute path from project root
-LSP_SERVER = Path(__file__).parent.parent.parent / "_build/default/jasmin-lsp/jasmin_lsp.exe"
+from conftest import LSPClient
 
 # Test fixture
 TEST_FILE_CONTENT = """// Test file for hover
@@ -26,43 +25,10 @@ inline fn double(reg u64 value) -> reg u64 {
 }
 """
 
-def send_request(proc, request):
-    content = json.dumps(request)
-    message = f"Content-Length: {len(content)}\r\n\r\n{content}"
-    proc.stdin.write(message.encode())
-    proc.stdin.flush()
-
-def read_response(proc, expected_id=None, timeout=2.0):
-    import select
-    while True:
-        ready, _, _ = select.select([proc.stdout], [], [], timeout)
-        if not ready:
-            return None
-        
-        headers = {}
-        while True:
-            line = proc.stdout.readline().decode().strip()
-            if not line:
-                break
-            if ": " not in line:
-                continue
-            key, value = line.split(": ", 1)
-            headers[key] = value
-        
-        content_length = int(headers.get("Content-Length", 0))
-        if content_length == 0:
-            return None
-        content = proc.stdout.read(content_length).decode()
-        response = json.loads(content)
-        
-        if expected_id is not None and "id" not in response:
-            continue
-        
-        if expected_id is not None and "id" in response:
-            if response["id"] == expected_id:
-                return response
-        else:
-            return response
+def wait_until_handled(client, uri):
+    """Block until the server has caught up: a documentSymbol reply follows all earlier messages"""
+    response = client.document_symbols(uri)
+    assert response is not None, f"Server did not answer a documentSymbol request for {uri}"
 
 def test_keyword_hover():
     """Test that hovering on keywords returns helpful info or nothing"""
@@ -77,49 +43,25 @@ def test_keyword_hover():
     
     test_uri = f"file://{test_path}"
     
-    proc = subprocess.Popen(
-        [LSP_SERVER],
-        stdin=subprocess.PIPE,
-        stdout=subprocess.PIPE,
-        stderr=subprocess.PIPE
-    )
+    client = LSPClient()
+    client.start()
     
     try:
         # Initialize
-        send_request(proc, {
-            "jsonrpc": "2.0",
-            "id": 1,
-            "method": "initialize",
-            "params": {
-                "processId": None,
-                "rootUri": f"file://{os.path.dirname(test_path)}",
-                "capabilities": {}
-            }
-        })
-        read_response(proc, expected_id=1)
-        
-        send_request(proc, {"jsonrpc": "2.0", "method": "initialized", "params": {}})
-        
-        import time
-        time.sleep(0.1)
+        client.initialize(f"file://{os.path.dirname(test_path)}")
         
         # Open test file
-        send_request(proc, {
-            "jsonrpc": "2.0",
-            "method": "textDocument/didOpen",
-            "params": {
-                "textDocument": {
-                    "uri": test_uri,
-                    "languageId": "jasmin",
-                    "version": 1,
-                    "text": TEST_FILE_CONTENT
-                }
+        client.send_notification("textDocument/didOpen", {
+            "textDocument": {
+                "uri": test_uri,
+                "languageId": "jasmin",
+                "version": 1,
+                "text": TEST_FILE_CONTENT
             }
         })
+        wait_until_handled(client, test_uri)
         print("✅ Opened test file")
         
-        time.sleep(0.1)
-        
         # Test cases: (line, char, symbol, should_have_hover)
         test_cases = [
             (3, 0, "fn", "keyword"),          # Line with "fn square"
@@ -134,7 +76,6 @@ def test_keyword_hover():
             (1, 10, "BUFFER_SIZE", "param"),  # param name
         ]
         
-        request_id = 2
         passed = 0
         failed = 0
         
@@ -149,18 +90,7 @@ def test_keyword_hover():
             if line_num < len(lines):
                 print(f"Line: {lines[line_num]}")
             
-            send_request(proc, {
-                "jsonrpc": "2.0",
-                "id": request_id,
-                "method": "textDocument/hover",
-                "params": {
-                    "textDocument": {"uri": test_uri},
-                    "position": {"line": line_num, "character": char_pos}
-                }
-            })
-            
-            response = read_response(proc, expected_id=request_id, timeout=3.0)
-            request_id += 1
+            response = client.hover(test_uri, line_num, char_pos)
             
             if not response:
                 print(f"❌ TIMEOUT: No response")
@@ -226,8 +156,7 @@ def test_keyword_hover():
             return False
         
     finally:
-        proc.terminate()
-        proc.wait()
+        client.stop()
         # Clean up test file
         if os.path.exists(test_path):
             os.remove(test_path)
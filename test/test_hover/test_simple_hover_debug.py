@@ -44,22 +44,8 @@ with tempfile.TemporaryDirectory() as tmpdir:
     print("Server STDERR output:")
     print("=" * 80)
     
-    # Read available stderr (non-blocking)
-    import fcntl
-    import os
-    
-    # Make stderr non-blocking
-    fd = client.process.stderr.fileno()
-    fl = fcntl.fcntl(fd, fcntl.F_GETFL)
-    fcntl.fcntl(fd, fcntl.F_SETFL, fl | os.O_NONBLOCK)
-    
-    try:
-        stderr_output = client.process.stderr.read()
-        if stderr_output:
-            print(stderr_output.decode('utf-8', errors='ignore'))
-        else:
-            print("(no stderr output)")
-    except:
-        print("(stderr not available)")
+    # The server's stderr is kept in a file, so reading it never blocks
+    stderr_output = client.get_stderr()
+    print(stderr_output if stderr_output else "(no stderr output)")
 
 client.stop()
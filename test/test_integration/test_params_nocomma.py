@@ -1,54 +1,23 @@
 #!/usr/bin/env python3
 import json
-import subprocess
+import os
+import sys
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
 
-server_path = './_build/default/jasmin-lsp/jasmin_lsp.exe'
-test_code = "fn test(reg u32 a b) { }"
-
-messages = [
-    {'jsonrpc': '2.0', 'id': 1, 'method': 'initialize',
-     'params': {'processId': None, 'rootUri': 'file:///tmp', 'capabilities': {}}},
-    {'jsonrpc': '2.0', 'method': 'initialized', 'params': {}},
-    {'jsonrpc': '2.0', 'method': 'textDocument/didOpen',
-     'params': {'textDocument': {'uri': 'file:///test.jazz', 'languageId': 'jasmin',
-                                  'version': 1, 'text': test_code}}},
-    {'jsonrpc': '2.0', 'id': 2, 'method': 'textDocument/documentSymbol',
-     'params': {'textDocument': {'uri': 'file:///test.jazz'}}}
-]
+from conftest import LSPClient, LSP_SERVER
 
-input_data = ''
-for msg in messages:
-    content = json.dumps(msg)
-    header = f'Content-Length: {len(content.encode())}\r\n\r\n'
-    input_data += header + content
+test_code = "fn test(reg u32 a b) { }"
 
-proc = subprocess.Popen([server_path], stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+# LSPClient reads framed messages off the live pipe, so this stops as soon
+# as the documentSymbol response arrives instead of waiting for EOF
+client = LSPClient(LSP_SERVER)
+client.start()
 try:
-    stdout, stderr = proc.communicate(input=input_data.encode(), timeout=5)
-except subprocess.TimeoutExpired:
-    proc.kill()
-    proc.communicate()
-    raise
+    client.initialize()
+    client.open_document('file:///test.jazz', test_code)
+    resp = client.document_symbols('file:///test.jazz')
+    if resp is not None:
+        print("\nDocument symbols (no commas):")
+        print(json.dumps(resp, indent=2))
 finally:
-    # Ensure process is terminated
-    if proc.poll() is None:
-        proc.terminate()
-        try:
-            proc.wait(timeout=2)
-        except subprocess.TimeoutExpired:
-            proc.kill()
-
-output = stdout.decode('utf-8', errors='ignore')
-while 'Content-Length:' in output:
-    try:
-        idx = output.index('Content-Length:')
-        output = output[idx:]
-        header_end = output.index('\r\n\r\n')
-        length = int(output[:header_end].split(':')[1].strip())
-        body = output[header_end+4:header_end+4+length]
-        resp = json.loads(body)
-        if 'id' in resp and resp['id'] == 2:
-            print("\nDocument symbols (no commas):")
-            print(json.dumps(resp, indent=2))
-        output = output[header_end+4+length:]
-    except: break
+    client.stop()
@@ -15,23 +15,23 @@ NC = '\033[0m'
 
 def send_lsp(server_path, messages):
     """Send messages to LSP server and get response"""
-    input_data = ""
+    parts = []
     for msg in messages:
-        content = json.dumps(msg)
-        content_bytes = content.encode('utf-8')
-        input_data += f"Content-Length: {len(content_bytes)}\r\n\r\n{content}"
+        body = json.dumps(msg).encode('utf-8')
+        parts.append(b"Content-Length: %d\r\n\r\n" % len(body))
+        parts.append(body)
     
     try:
         result = subprocess.run(
             [server_path],
-            input=input_data,
+            input=b"".join(parts),
             capture_output=True,
-            text=True,
             timeout=5
         )
-        return result.stdout + result.stderr
+        output = result.stdout + result.stderr
     except subprocess.TimeoutExpired as e:
-        return (e.stdout or "") + (e.stderr or "")
+        output = (e.stdout or b"") + (e.stderr or b"")
+    return output.decode('utf-8', errors='replace')
 
 # Real Jasmin file content
 gimli_jazz = """param int N_ROUND = 24;
@@ -16,15 +16,15 @@ messages = [
      'params': {'textDocument': {'uri': 'file:///test.jazz'}}}
 ]
 
-input_data = ''
+parts = []
 for msg in messages:
-    content = json.dumps(msg)
-    header = f'Content-Length: {len(content.encode())}\r\n\r\n'
-    input_data += header + content
+    body = json.dumps(msg).encode()
+    parts.append(b'Content-Length: %d\r\n\r\n' % len(body))
+    parts.append(body)
 
 proc = subprocess.Popen([server_path], stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
 try:
-    stdout, stderr = proc.communicate(input=input_data.encode(), timeout=5)
+    stdout, stderr = proc.communicate(input=b''.join(parts), timeout=5)
 except subprocess.TimeoutExpired:
     proc.kill()
     proc.communicate()
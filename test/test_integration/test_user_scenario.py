@@ -35,11 +35,12 @@ def test_from_common_require_navigation():
              'params': {'textDocument': {'uri': main_uri}, 'position': {'line': 1, 'character': 12}}}
         ]
         
-        input_data = ''.join(f'Content-Length: {len(json.dumps(m).encode())}\r\n\r\n{json.dumps(m)}' for m in messages)
+        bodies = [json.dumps(m).encode() for m in messages]
+        input_data = b''.join(b'Content-Length: %d\r\n\r\n%s' % (len(body), body) for body in bodies)
         
         proc = subprocess.Popen([server_path], stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
         try:
-            stdout, _ = proc.communicate(input=input_data.encode(), timeout=10)
+            stdout, _ = proc.communicate(input=input_data, timeout=10)
         except subprocess.TimeoutExpired:
             proc.kill()
             proc.communicate()
@@ -4,51 +4,19 @@ Comprehensive test for cross-file variable navigation
 Tests realistic crypto library scenario
 """
 
-import subprocess
-import json
 import sys
 import os
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
 
-LSP_SERVER = "_build/default/jasmin-lsp/jasmin_lsp.exe"
+from conftest import LSPClient
 
-def send_request(proc, request):
-    content = json.dumps(request)
-    message = f"Content-Length: {len(content)}\r\n\r\n{content}"
-    proc.stdin.write(message.encode())
-    proc.stdin.flush()
+# Resolved once; every URI below is built from it
+CRYPTO_DIR = os.path.abspath("test/fixtures/crypto")
 
-def read_response(proc, expected_id=None, timeout=2.0):
-    import select
-    while True:
-        # Check if data is available with timeout
-        ready, _, _ = select.select([proc.stdout], [], [], timeout)
-        if not ready:
-            return None
-        
-        headers = {}
-        while True:
-            line = proc.stdout.readline().decode().strip()
-            if not line:
-                break
-            if ": " not in line:
-                continue
-            key, value = line.split(": ", 1)
-            headers[key] = value
-        
-        content_length = int(headers.get("Content-Length", 0))
-        if content_length == 0:
-            return None
-        content = proc.stdout.read(content_length).decode()
-        response = json.loads(content)
-        
-        if expected_id is not None and "id" not in response:
-            continue
-        
-        if expected_id is not None and "id" in response:
-            if response["id"] == expected_id:
-                return response
-        else:
-            return response
+def wait_until_handled(client, uri):
+    """Return once every message sent so far is processed (replies come in order)"""
+    response = client.document_symbols(uri)
+    assert response is not None, f"Server did not answer a documentSymbol request for {uri}"
 
 def test_crypto_example():
     """Test cross-file navigation in realistic crypto library"""
@@ -57,61 +25,35 @@ def test_crypto_example():
     print("Testing: Crypto Library with params and globals")
     print("="*70)
     
-    config_path = os.path.abspath("test/fixtures/crypto/config.jazz")
-    state_path = os.path.abspath("test/fixtures/crypto/state.jazz")
-    chacha_path = os.path.abspath("test/fixtures/crypto/chacha20.jazz")
+    config_path = os.path.join(CRYPTO_DIR, "config.jazz")
+    state_path = os.path.join(CRYPTO_DIR, "state.jazz")
+    chacha_path = os.path.join(CRYPTO_DIR, "chacha20.jazz")
     
     config_uri = f"file://{config_path}"
     state_uri = f"file://{state_path}"
     chacha_uri = f"file://{chacha_path}"
     
-    proc = subprocess.Popen(
-        [LSP_SERVER],
-        stdin=subprocess.PIPE,
-        stdout=subprocess.PIPE,
-        stderr=subprocess.PIPE
-    )
+    client = LSPClient()
+    client.start()
     
     try:
         # Initialize
-        send_request(proc, {
-            "jsonrpc": "2.0",
-            "id": 1,
-            "method": "initialize",
-            "params": {
-                "processId": None,
-                "rootUri": f"file://{os.path.abspath('test/fixtures/crypto')}",
-                "capabilities": {}
-            }
-        })
-        read_response(proc, expected_id=1)
-        
-        send_request(proc, {
-            "jsonrpc": "2.0",
-            "method": "initialized",
-            "params": {}
-        })
-        
-        import time
-        time.sleep(0.1)
+        client.initialize(f"file://{CRYPTO_DIR}")
         
         # Open all files
         for path, uri in [(config_path, config_uri), (state_path, state_uri), (chacha_path, chacha_uri)]:
             with open(path) as f:
                 content = f.read()
-            send_request(proc, {
-                "jsonrpc": "2.0",
-                "method": "textDocument/didOpen",
-                "params": {
-                    "textDocument": {
-                        "uri": uri,
-                        "languageId": "jasmin",
-                        "version": 1,
-                        "text": content
-                    }
+            client.send_notification("textDocument/didOpen", {
+                "textDocument": {
+                    "uri": uri,
+                    "languageId": "jasmin",
+                    "version": 1,
+                    "text": content
                 }
             })
         
+        wait_until_handled(client, chacha_uri)
         print("\n✓ Opened config.jazz, state.jazz, and chacha20.jazz")
         
         # Read chacha20.jazz to find test positions
@@ -129,7 +71,6 @@ def test_crypto_example():
         
         passed = 0
         failed = 0
-        request_id = 2
         
         for symbol_name, expected_uri, expected_file in test_cases:
             # Find the symbol in chacha20.jazz
@@ -153,18 +94,7 @@ def test_crypto_example():
             print(f"Line {found_line}: {chacha_lines[found_line].strip()}")
             
             # Send definition request
-            send_request(proc, {
-                "jsonrpc": "2.0",
-                "id": request_id,
-                "method": "textDocument/definition",
-                "params": {
-                    "textDocument": {"uri": chacha_uri},
-                    "position": {"line": found_line, "character": char_pos + 2}
-                }
-            })
-            
-            response = read_response(proc, expected_id=request_id, timeout=5.0)
-            request_id += 1
+            response = client.definition(chacha_uri, found_line, char_pos + 2)
             
             if response is None:
                 print(f"❌ FAIL: Timeout waiting for response")
@@ -207,8 +137,7 @@ def test_crypto_example():
             return False
         
     finally:
-        proc.terminate()
-        proc.wait()
+        client.stop()
 
 if __name__ == "__main__":
     success = test_crypto_example()
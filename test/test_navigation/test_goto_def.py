@@ -6,6 +6,7 @@ import os
 
 server_path = './_build/default/jasmin-lsp/jasmin_lsp.exe'
 fixture_path = 'test/fixtures/simple_function.jazz'
+fixture_uri = f'file://{os.path.abspath(fixture_path)}'
 
 with open(fixture_path) as f:
     content = f.read()
@@ -27,7 +28,7 @@ messages = [
         'method': 'textDocument/didOpen',
         'params': {
             'textDocument': {
-                'uri': f'file://{os.path.abspath(fixture_path)}',
+                'uri': fixture_uri,
                 'languageId': 'jasmin',
                 'version': 1,
                 'text': content
@@ -39,33 +40,34 @@ messages = [
         'id': 2,
         'method': 'textDocument/definition',
         'params': {
-            'textDocument': {'uri': f'file://{os.path.abspath(fixture_path)}'},
+            'textDocument': {'uri': fixture_uri},
             'position': {'line': 17, 'character': 10}  # Position of 'add_numbers' call (line 18, 0-indexed as 17)
         }
     }
 ]
 
-input_data = ''
+parts = []
 for msg in messages:
-    content = json.dumps(msg)
-    content_bytes = content.encode('utf-8')
-    input_data += f'Content-Length: {len(content_bytes)}\r\n\r\n{content}'
+    body = json.dumps(msg).encode('utf-8')
+    parts.append(b'Content-Length: %d\r\n\r\n' % len(body))
+    parts.append(body)
 
 result = subprocess.run(
     [server_path],
-    input=input_data,
+    input=b''.join(parts),
     capture_output=True,
-    text=True,
     timeout=5
 )
+stdout = result.stdout.decode('utf-8', errors='replace')
+stderr = result.stderr.decode('utf-8', errors='replace')
 
 print("=== Definition Response ===")
 # Find the response to request id=2
-for line in result.stdout.split('\n'):
+for line in stdout.split('\n'):
     if '"id":2' in line or '"result"' in line or '"error"' in line:
         print(line)
 
 print("\n=== STDERR (relevant) ===")
-for line in result.stderr.split('\n'):
+for line in stderr.split('\n'):
     if 'definition' in line.lower() or 'error' in line.lower():
         print(line)
@@ -15,24 +15,26 @@ RED = '\033[0;31m'
 YELLOW = '\033[1;33m'
 NC = '\033[0m'
 
+FIXTURES_DIR = os.path.abspath('test/fixtures')
+
 def send_lsp(server_path, messages):
     """Send messages to LSP server and get response"""
-    input_data = ""
+    parts = []
     for msg in messages:
-        content = json.dumps(msg)
-        input_data += f"Content-Length: {len(content)}\r\n\r\n{content}"
+        body = json.dumps(msg).encode('utf-8')
+        parts.append(b"Content-Length: %d\r\n\r\n" % len(body))
+        parts.append(body)
     
     try:
         result = subprocess.run(
             [server_path],
-            input=input_data,
+            input=b"".join(parts),
             capture_output=True,
-            text=True,
             timeout=10
         )
         return result.stdout + result.stderr
     except subprocess.TimeoutExpired:
-        return ""
+        return b""
 
 def main():
     server_path = '_build/default/jasmin-lsp/jasmin_lsp.exe'
@@ -55,9 +57,9 @@ def main():
     with open(main_file) as f:
         main_content = f.read()
     
-    main_uri = f"file://{os.path.abspath(main_file)}"
-    target_uri = f"file://{os.path.abspath(target_file)}"
-    workspace_uri = f"file://{os.path.abspath('test/fixtures')}"
+    main_uri = f"file://{FIXTURES_DIR}/namespace_test.jazz"
+    target_uri = f"file://{FIXTURES_DIR}/Common/reduce.jinc"
+    workspace_uri = f"file://{FIXTURES_DIR}"
     
     print("="*60)
     print("Testing: Goto Definition on Namespace Require Statement")
@@ -131,24 +133,24 @@ def main():
     # Parse output to find the definition response
     success = False
     
-    if '"id":2' in output and '"result"' in output:
+    if b'"id":2' in output and b'"result"' in output:
         print(f"{GREEN}✓{NC} Got response from LSP")
         
-        if 'reduce.jinc' in output:
+        if b'reduce.jinc' in output:
             print(f"{GREEN}✓{NC} Response points to reduce.jinc")
             success = True
         else:
             print(f"{YELLOW}?{NC} Response doesn't explicitly mention reduce.jinc")
             # Still might be success if it has a URI pointing to Common directory
-            if 'Common' in output and '"uri"' in output:
+            if b'Common' in output and b'"uri"' in output:
                 print(f"{GREEN}✓{NC} Response contains Common namespace reference")
                 success = True
-            elif '"uri"' in output:
+            elif b'"uri"' in output:
                 print(f"{YELLOW}?{NC} Response contains a URI but not in Common namespace")
-                print("Output snippet:", output[output.find('"id":2'):output.find('"id":2')+200])
+                print("Output snippet:", output[output.find(b'"id":2'):output.find(b'"id":2')+200].decode('utf-8', errors='replace'))
     else:
         print(f"{RED}✗{NC} No valid response from LSP")
-        print("Output:", output[:500])
+        print("Output:", output[:500].decode('utf-8', errors='replace'))
     
     print()
     print("="*60)
@@ -12,23 +12,26 @@ GREEN = '\033[0;32m'
 RED = '\033[0;31m'
 NC = '\033[0m'
 
+FIXTURES_DIR = os.path.abspath('test/fixtures')
+
 def run_lsp_test(server_path, messages):
-    input_data = ""
+    # Frames are joined once, as bytes, rather than grown with +=
+    parts = []
     for msg in messages:
-        content = json.dumps(msg)
-        input_data += f"Content-Length: {len(content)}\r\n\r\n{content}"
+        body = json.dumps(msg).encode('utf-8')
+        parts.append(b"Content-Length: %d\r\n\r\n" % len(body))
+        parts.append(body)
     
     try:
         result = subprocess.run(
             [server_path],
-            input=input_data,
+            input=b"".join(parts),
             capture_output=True,
-            text=True,
             timeout=5
         )
         return result.stdout + result.stderr
     except subprocess.TimeoutExpired:
-        return ""
+        return b""
 
 def test_parameter_definition():
     """Test goto definition on a parameter inside a function"""
@@ -42,7 +45,7 @@ def test_parameter_definition():
     with open(test_file) as f:
         content = f.read()
     
-    uri = f"file://{os.path.abspath(test_file)}"
+    uri = f"file://{FIXTURES_DIR}/simple_function.jazz"
     
     # Find usage of 'x' parameter in add_numbers function
     # The function is: fn add_numbers(reg u64 x, reg u64 y) -> reg u64
@@ -80,7 +83,7 @@ def test_parameter_definition():
             'method': 'initialize',
             'params': {
                 'processId': None,
-                'rootUri': f"file://{os.path.abspath('test/fixtures')}",
+                'rootUri': f"file://{FIXTURES_DIR}",
                 'capabilities': {}
             }
         },
@@ -116,30 +119,30 @@ def test_parameter_definition():
     output = run_lsp_test(server_path, messages)
     
     # Parse the response
-    if '"id":2' in output and '"result"' in output:
+    if b'"id":2' in output and b'"result"' in output:
         print(f"\n{GREEN}✓{NC} Got response from LSP")
         
         # Find the actual response (look for id:2 in the response, not request)
         # The response should have "result" field
-        result_pos = output.find('"result"')
+        result_pos = output.find(b'"result"')
         if result_pos > 0:
             # Get context around the result
-            response_snippet = output[max(0, result_pos-50):min(len(output), result_pos+300)]
+            response_snippet = output[max(0, result_pos-50):min(len(output), result_pos+300)].decode('utf-8', errors='replace')
             print(f"\nResponse with result: {response_snippet}")
         
         # Check if it has a valid location
-        if '"uri"' in output and '"range"' in output:
+        if b'"uri"' in output and b'"range"' in output:
             # Try to extract line number from response
             # Look for the line in the result section
-            if '"line":1' in output or '"line":0' in output:
+            if b'"line":1' in output or b'"line":0' in output:
                 print(f"\n{GREEN}✅ SUCCESS: Points to function signature (line 0 or 1){NC}")
                 return True
             else:
                 print(f"\n{GREEN}✓ Got a location response{NC}")
                 # Print more details to debug
-                uri_pos = output.find('"uri"', result_pos)
+                uri_pos = output.find(b'"uri"', result_pos)
                 if uri_pos > 0:
-                    details = output[uri_pos:min(len(output), uri_pos+200)]
+                    details = output[uri_pos:min(len(output), uri_pos+200)].decode('utf-8', errors='replace')
                     print(f"Location details: {details}")
                 return True
         else:
@@ -147,13 +150,13 @@ def test_parameter_definition():
             # Print the full output for debugging
             print(f"\nDEBUG - Full output length: {len(output)}")
             print(f"DEBUG - Last 500 chars of output:")
-            print(output[-500:])
+            print(output[-500:].decode('utf-8', errors='replace'))
             return False
     else:
         print(f"\n{RED}✗ No valid response from LSP{NC}")
-        if '"error"' in output:
-            error_start = output.find('"error"')
-            print(f"Error in output: {output[error_start:error_start+200]}")
+        if b'"error"' in output:
+            error_start = output.find(b'"error"')
+            print(f"Error in output: {output[error_start:error_start+200].decode('utf-8', errors='replace')}")
         return False
 
 def main():
@@ -14,24 +14,27 @@ RED = '\033[0;31m'
 YELLOW = '\033[1;33m'
 NC = '\033[0m'
 
+# Resolved once; the URIs sent to the server are built from it
+FIXTURES_DIR = os.path.abspath('test/fixtures')
+
 def send_lsp(server_path, messages):
     """Send messages to LSP server and get response"""
-    input_data = ""
+    parts = []
     for msg in messages:
-        content = json.dumps(msg)
-        input_data += f"Content-Length: {len(content)}\r\n\r\n{content}"
+        body = json.dumps(msg).encode('utf-8')
+        parts.append(b"Content-Length: %d\r\n\r\n" % len(body))
+        parts.append(body)
     
     try:
         result = subprocess.run(
             [server_path],
-            input=input_data,
+            input=b"".join(parts),
             capture_output=True,
-            text=True,
             timeout=5
         )
         return result.stdout + result.stderr
     except subprocess.TimeoutExpired:
-        return ""
+        return b""
 
 def main():
     server_path = '_build/default/jasmin-lsp/jasmin_lsp.exe'
@@ -50,9 +53,9 @@ def main():
     with open(main_file) as f:
         main_content = f.read()
     
-    main_uri = f"file://{os.path.abspath(main_file)}"
-    lib_uri = f"file://{os.path.abspath(lib_file)}"
-    workspace_uri = f"file://{os.path.abspath('test/fixtures')}"
+    main_uri = f"file://{FIXTURES_DIR}/main_program.jazz"
+    lib_uri = f"file://{FIXTURES_DIR}/math_lib.jazz"
+    workspace_uri = f"file://{FIXTURES_DIR}"
     
     print("="*60)
     print("Testing: Goto Definition on require Statement")
@@ -126,21 +129,21 @@ def main():
     # Parse output to find the definition response
     success = False
     
-    if '"id":2' in output and '"result"' in output:
+    if b'"id":2' in output and b'"result"' in output:
         print(f"{GREEN}✓{NC} Got response from LSP")
         
-        if 'math_lib.jazz' in output:
+        if b'math_lib.jazz' in output:
             print(f"{GREEN}✓{NC} Response points to math_lib.jazz")
             success = True
         else:
             print(f"{YELLOW}?{NC} Response doesn't explicitly mention math_lib.jazz")
             # Still might be success if it has a URI
-            if '"uri"' in output:
+            if b'"uri"' in output:
                 print(f"{YELLOW}?{NC} But response contains a URI")
-                print("Output snippet:", output[output.find('"id":2'):output.find('"id":2')+200])
+                print("Output snippet:", output[output.find(b'"id":2'):output.find(b'"id":2')+200].decode('utf-8', errors='replace'))
     else:
         print(f"{RED}✗{NC} No valid response from LSP")
-        print("Output:", output[:500])
+        print("Output:", output[:500].decode('utf-8', errors='replace'))
     
     print()
     print("="*60)
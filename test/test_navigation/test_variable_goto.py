@@ -3,13 +3,12 @@
 Test cross-file variable goto definition
 """
 
-import subprocess
 import json
 import sys
 import os
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
 
-# Paths
-LSP_SERVER = "_build/default/jasmin-lsp/jasmin_lsp.exe"
+from conftest import LSPClient
 
 # Test fixture with global variable
 GLOBALS_FILE = """// globals.jazz - defines global variables
@@ -50,45 +49,10 @@ def create_test_files():
         os.path.abspath("test/fixtures/variables/main.jazz")
     )
 
-def send_request(proc, request):
-    """Send a JSON-RPC request to LSP server"""
-    content = json.dumps(request)
-    message = f"Content-Length: {len(content)}\r\n\r\n{content}"
-    proc.stdin.write(message.encode())
-    proc.stdin.flush()
-
-def read_response(proc, expected_id=None):
-    """Read a JSON-RPC response from LSP server"""
-    while True:
-        # Read headers
-        headers = {}
-        while True:
-            line = proc.stdout.readline().decode().strip()
-            if not line:
-                break
-            if ": " not in line:
-                continue
-            key, value = line.split(": ", 1)
-            headers[key] = value
-        
-        # Read content
-        content_length = int(headers.get("Content-Length", 0))
-        if content_length == 0:
-            return None
-        content = proc.stdout.read(content_length).decode()
-        response = json.loads(content)
-        
-        # Skip notifications (no id field) unless we're not looking for a specific ID
-        if expected_id is not None and "id" not in response:
-            continue
-        
-        # If we're looking for a specific ID and this doesn't match, keep reading
-        if expected_id is not None and "id" in response:
-            if response["id"] == expected_id:
-                return response
-            # Otherwise, skip this response and keep reading
-        else:
-            return response
+def wait_until_handled(client, uri):
+    """Barrier: the server handles messages in order, so this returns after prior opens"""
+    response = client.document_symbols(uri)
+    assert response is not None, f"Server did not answer a documentSymbol request for {uri}"
 
 def test_variable_goto():
     """Test goto definition for cross-file variables"""
@@ -106,53 +70,24 @@ def test_variable_goto():
     main_uri = f"file://{main_path}"
     
     # Start LSP server
-    proc = subprocess.Popen(
-        [LSP_SERVER],
-        stdin=subprocess.PIPE,
-        stdout=subprocess.PIPE,
-        stderr=subprocess.PIPE
-    )
+    client = LSPClient()
+    client.start()
     
     try:
         # Initialize
-        send_request(proc, {
-            "jsonrpc": "2.0",
-            "id": 1,
-            "method": "initialize",
-            "params": {
-                "processId": None,
-                "rootUri": f"file://{os.path.abspath('test/fixtures/variables')}",
-                "capabilities": {}
-            }
-        })
-        response = read_response(proc)
+        client.initialize(f"file://{os.path.abspath('test/fixtures/variables')}")
         print(f"\n✓ Initialized LSP server")
         
-        # Send initialized notification
-        send_request(proc, {
-            "jsonrpc": "2.0",
-            "method": "initialized",
-            "params": {}
-        })
-        
-        # Read any responses (might be config request)
-        import time
-        time.sleep(0.1)
-        
         # Open globals.jazz
         with open(globals_path) as f:
             globals_content = f.read()
         
-        send_request(proc, {
-            "jsonrpc": "2.0",
-            "method": "textDocument/didOpen",
-            "params": {
-                "textDocument": {
-                    "uri": globals_uri,
-                    "languageId": "jasmin",
-                    "version": 1,
-                    "text": globals_content
-                }
+        client.send_notification("textDocument/didOpen", {
+            "textDocument": {
+                "uri": globals_uri,
+                "languageId": "jasmin",
+                "version": 1,
+                "text": globals_content
             }
         })
         print(f"✓ Opened globals.jazz")
@@ -161,18 +96,15 @@ def test_variable_goto():
         with open(main_path) as f:
             main_content = f.read()
         
-        send_request(proc, {
-            "jsonrpc": "2.0",
-            "method": "textDocument/didOpen",
-            "params": {
-                "textDocument": {
-                    "uri": main_uri,
-                    "languageId": "jasmin",
-                    "version": 1,
-                    "text": main_content
-                }
+        client.send_notification("textDocument/didOpen", {
+            "textDocument": {
+                "uri": main_uri,
+                "languageId": "jasmin",
+                "version": 1,
+                "text": main_content
             }
         })
+        wait_until_handled(client, main_uri)
         print(f"✓ Opened main.jazz")
         
         # Test 1: Goto definition for BUFFER_SIZE (parameter)
@@ -193,20 +125,10 @@ def test_variable_goto():
             # Position on BUFFER_SIZE (after the =)
             char_pos = main_lines[buffer_size_line].index('BUFFER_SIZE')
             
-            send_request(proc, {
-                "jsonrpc": "2.0",
-                "id": 2,
-                "method": "textDocument/definition",
-                "params": {
-                    "textDocument": {"uri": main_uri},
-                    "position": {"line": buffer_size_line, "character": char_pos + 5}
-                }
-            })
-            
-            response = read_response(proc, expected_id=2)
+            response = client.definition(main_uri, buffer_size_line, char_pos + 5)
             print(f"\nResponse: {json.dumps(response, indent=2)}")
             
-            if "result" in response and response["result"]:
+            if response and "result" in response and response["result"]:
                 locations = response["result"]
                 if isinstance(locations, list) and len(locations) > 0:
                     loc = locations[0]
@@ -243,20 +165,10 @@ def test_variable_goto():
         if shared_data_line is not None:
             char_pos = main_lines[shared_data_line].index('shared_data')
             
-            send_request(proc, {
-                "jsonrpc": "2.0",
-                "id": 3,
-                "method": "textDocument/definition",
-                "params": {
-                    "textDocument": {"uri": main_uri},
-                    "position": {"line": shared_data_line, "character": char_pos + 5}
-                }
-            })
-            
-            response = read_response(proc, expected_id=3)
+            response = client.definition(main_uri, shared_data_line, char_pos + 5)
             print(f"\nResponse: {json.dumps(response, indent=2)}")
             
-            if "result" in response and response["result"]:
+            if response and "result" in response and response["result"]:
                 locations = response["result"]
                 if isinstance(locations, list) and len(locations) > 0:
                     loc = locations[0]
@@ -284,8 +196,7 @@ def test_variable_goto():
         return True
         
     finally:
-        proc.terminate()
-        proc.wait()
+        client.stop()
 
 if __name__ == "__main__":
     success = test_variable_goto()
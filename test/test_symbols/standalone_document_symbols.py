@@ -47,23 +47,23 @@ export fn main() -> reg u64 {
 
 def run_lsp_command(server_path, messages, timeout=3):
     """Send messages to LSP server and collect all output"""
-    input_data = ""
+    parts = []
     for msg in messages:
-        content = json.dumps(msg)
-        content_bytes = content.encode('utf-8')
-        input_data += f"Content-Length: {len(content_bytes)}\r\n\r\n{content}"
+        body = json.dumps(msg).encode('utf-8')
+        parts.append(b"Content-Length: %d\r\n\r\n" % len(body))
+        parts.append(body)
         
     try:
         result = subprocess.run(
             [server_path],
-            input=input_data,
+            input=b"".join(parts),
             capture_output=True,
-            text=True,
             timeout=timeout
         )
-        return result.stdout + result.stderr
+        output = result.stdout + result.stderr
     except subprocess.TimeoutExpired as e:
-        return (e.stdout or "") + (e.stderr or "")
+        output = (e.stdout or b"") + (e.stderr or b"")
+    return output.decode('utf-8', errors='replace')
 
 def test_document_symbols():
     """Test document symbols feature"""